@@ -1,6 +1,7 @@
 package com.yogakotlinpipeline.app
 
 import android.os.Bundle
+import android.util.Log
 import android.view.LayoutInflater
 import android.view.View
 import android.view.ViewGroup
@@ -13,7 +14,9 @@ import androidx.fragment.app.Fragment
 import androidx.lifecycle.lifecycleScope
 import androidx.recyclerview.widget.LinearLayoutManager
 import androidx.recyclerview.widget.RecyclerView
+import com.yogakotlinpipeline.app.utils.ChatStreamException
 import com.yogakotlinpipeline.app.utils.ChatbotService
+import kotlinx.coroutines.CancellationException
 import kotlinx.coroutines.launch
 
 class ChatbotFragment : Fragment() {
@@ -96,6 +99,8 @@ class ChatbotFragment : Fragment() {
 
         lifecycleScope.launch {
             try {
+                if (streamReply(messageText)) return@launch
+                
                 val response = chatbotService.sendMessage(messageText)
                 if (response != null) {
                     messages.add(ChatMessage(response, isUser = false))
@@ -120,6 +125,58 @@ class ChatbotFragment : Fragment() {
         }
     }
 
+    /**
+     * Show the bot reply as it is generated. Returns false only if the stream
+     * could not be used at all (HTTP or network failure before any text), so the
+     * caller can fall back to the non-streaming endpoint. A stream the server
+     * delivered is shown as is, even if it ends empty or with an error, so a
+     * degraded backend is never asked for the same answer twice.
+     */
+    private suspend fun streamReply(messageText: String): Boolean {
+        var botIndex = -1
+        val reply = StringBuilder()
+        
+        try {
+            chatbotService.streamMessage(messageText).collect { delta ->
+                reply.append(delta)
+                if (botIndex == -1) {
+                    loadingIndicator.visibility = View.GONE
+                    messages.add(ChatMessage(reply.toString(), isUser = false))
+                    botIndex = messages.size - 1
+                    messageAdapter.notifyItemInserted(botIndex)
+                } else {
+                    messages[botIndex] = messages[botIndex].copy(text = reply.toString())
+                    messageAdapter.notifyItemChanged(botIndex)
+                }
+                messagesRecyclerView.scrollToPosition(botIndex)
+            }
+        } catch (e: CancellationException) {
+            throw e
+        } catch (e: Exception) {
+            Log.e("ChatbotFragment", "Streaming failed: ${e.message}", e)
+            if (botIndex == -1) {
+                if (e !is ChatStreamException) return false
+                addBotMessage("Sorry, I couldn't process your request. Please try again.")
+            } else {
+                messages[botIndex] = messages[botIndex].copy(
+                    text = reply.toString() + "\n\nSorry, the answer was cut off. Please try again."
+                )
+                messageAdapter.notifyItemChanged(botIndex)
+            }
+            return true
+        }
+        if (botIndex == -1) {
+            addBotMessage("Sorry, I don't have an answer to that. Please try rephrasing your question.")
+        }
+        return true
+    }
+    
+    private fun addBotMessage(text: String) {
+        messages.add(ChatMessage(text, isUser = false))
+        messageAdapter.notifyItemInserted(messages.size - 1)
+        messagesRecyclerView.scrollToPosition(messages.size - 1)
+    }
+
     override fun onDestroy() {
         super.onDestroy()
         chatbotService.clearConversationHistory()
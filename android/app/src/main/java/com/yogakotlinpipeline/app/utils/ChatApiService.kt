@@ -1,13 +1,20 @@
 package com.yogakotlinpipeline.app.utils
 
+import okhttp3.ResponseBody
 import retrofit2.Response
 import retrofit2.http.Body
 import retrofit2.http.POST
+import retrofit2.http.Streaming
 import com.google.gson.annotations.SerializedName
 
 interface ChatApiService {
     @POST("chat/")
     suspend fun chat(@Body request: ChatRequest): Response<ChatResponse>
+
+    // Server-sent events: one `data: {...}` line per generated chunk
+    @Streaming
+    @POST("chat/stream")
+    suspend fun chatStream(@Body request: ChatRequest): Response<ResponseBody>
 }
 
 data class ChatRequest(
@@ -17,3 +24,9 @@ data class ChatRequest(
 data class ChatResponse(
     val response: String
 )
+
+data class ChatStreamEvent(
+    val delta: String? = null,
+    val done: Boolean? = null,
+    val error: String? = null
+)
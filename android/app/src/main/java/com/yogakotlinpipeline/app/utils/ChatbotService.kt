@@ -1,10 +1,16 @@
 package com.yogakotlinpipeline.app.utils
 
 import android.util.Log
+import com.google.gson.Gson
+import kotlinx.coroutines.Dispatchers
+import kotlinx.coroutines.flow.Flow
+import kotlinx.coroutines.flow.flow
+import kotlinx.coroutines.flow.flowOn
 import okhttp3.OkHttpClient
 import okhttp3.logging.HttpLoggingInterceptor
 import retrofit2.Retrofit
 import retrofit2.converter.gson.GsonConverterFactory
+import java.io.IOException
 import java.util.concurrent.TimeUnit
 
 class ChatbotService {
@@ -27,13 +33,22 @@ class ChatbotService {
         createApiService()
     }
     
+    // BODY-level logging buffers the whole response, so streaming uses a client that only logs headers
+    private val streamingApiService: ChatApiService by lazy {
+        createApiService(HttpLoggingInterceptor.Level.HEADERS)
+    }
+    
+    private val gson = Gson()
+    
     private val conversationHistory = mutableListOf<Map<String, String>>()
     
-    private fun createApiService(): ChatApiService {
+    private fun createApiService(
+        logLevel: HttpLoggingInterceptor.Level = HttpLoggingInterceptor.Level.BODY
+    ): ChatApiService {
         val loggingInterceptor = HttpLoggingInterceptor { message ->
             Log.d(TAG, message)
         }.apply {
-            level = HttpLoggingInterceptor.Level.BODY
+            level = logLevel
         }
         
         val okHttpClient = OkHttpClient.Builder()
@@ -74,8 +89,47 @@ class ChatbotService {
         }
     }
     
+    /**
+     * Stream the answer from /chat/stream, emitting text chunks as they arrive.
+     * Throws IOException if the request fails or the stream is cut off, or
+     * ChatStreamException (an IOException) if the server answered but reported
+     * an error in the stream.
+     */
+    fun streamMessage(message: String): Flow<String> = flow {
+        Log.d(TAG, "Streaming message: $message")
+        
+        val response = streamingApiService.chatStream(ChatRequest(message = message))
+        if (!response.isSuccessful) {
+            val errorBody = response.errorBody()?.string()
+            Log.e(TAG, "API Error: ${response.code()} - $errorBody")
+            throw IOException("Chat stream failed with HTTP ${response.code()}")
+        }
+        
+        val body = response.body() ?: throw IOException("Empty chat stream")
+        var done = false
+        body.use {
+            val source = it.source()
+            while (!done && !source.exhausted()) {
+                val line = source.readUtf8Line() ?: break
+                if (!line.startsWith("data:")) continue
+                
+                val event = gson.fromJson(line.removePrefix("data:").trim(), ChatStreamEvent::class.java)
+                when {
+                    event.error != null -> throw ChatStreamException(event.error)
+                    event.done == true -> done = true
+                    event.delta != null -> emit(event.delta)
+                }
+            }
+        }
+        // A stream that stops before its done event was cut off in transit
+        if (!done) throw IOException("Chat stream ended before completion")
+    }.flowOn(Dispatchers.IO)
+    
     fun clearConversationHistory() {
         conversationHistory.clear()
         Log.d(TAG, "Conversation history cleared")
     }
 }
+
+/** The chat stream was delivered, but the server reported that generating the answer failed */
+class ChatStreamException(message: String) : IOException(message)
@@ -0,0 +1,52 @@
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+
+class RecommenderRegistry:
+    """
+    Process-wide cache of recommender instances shared across calls from Kotlin
+    Instances are keyed by embeddings path and rebuilt when the file's mtime changes
+    """
+    def __init__(self, factory: Callable[[str], object]):
+        self.factory = factory
+        self._instances: Dict[str, Tuple[Optional[int], object]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _mtime(path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def get(self, embeddings_path: str):
+        """Return the cached recommender for this path, building or reloading it if needed"""
+        path = os.path.abspath(embeddings_path)
+        mtime = self._mtime(path)
+
+        with self._lock:
+            entry = self._instances.get(path)
+            if entry is not None and entry[0] == mtime:
+                return entry[1]
+
+            if entry is not None:
+                print(f"Embeddings changed on disk, reloading {path}")
+            instance = self.factory(path)
+            self._instances[path] = (mtime, instance)
+            return instance
+
+    def warm_up(self, embeddings_path: str) -> bool:
+        """Build the recommender ahead of the first request; returns whether embeddings loaded"""
+        return getattr(self.get(embeddings_path), "df", None) is not None
+
+    def release(self, embeddings_path: Optional[str] = None):
+        """Drop one cached recommender, or all of them when no path is given"""
+        with self._lock:
+            if embeddings_path is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(os.path.abspath(embeddings_path), None)
+
+    def __len__(self) -> int:
+        return len(self._instances)
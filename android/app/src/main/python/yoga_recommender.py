@@ -4,6 +4,24 @@ from sentence_transformers import SentenceTransformer, util
 import pickle
 import os
 import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from ranking import top_k
+from recommender_registry import RecommenderRegistry
+
+@lru_cache(maxsize=1)
+def get_model():
+    """Load the sentence transformer once per process; shared by every recommender instance"""
+    print("Loading sentence transformer model...")
+    model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+    print("Sentence transformer model loaded successfully!")
+    return model
+
+# Cosine similarity above which a pose's contraindications are treated as matching a user issue
+CONTRA_THRESHOLD = 0.25
+ISSUE_CACHE_SIZE = 256
 
 class YogaRecommender:
     def __init__(self, embeddings_path):
@@ -11,11 +29,14 @@ class YogaRecommender:
         Initialize the yoga recommender with pre-computed embeddings
         Uses the same approach as the notebook with sentence transformers
         """
-        print("Loading sentence transformer model...")
-        self.model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-        print("Sentence transformer model loaded successfully!")
+        self.model = get_model()
         
         self.df = None
+        self.contra_emb = None
+        self.contra_text = None
+        self.issue_cache = OrderedDict()
+        # One instance is shared by every Chaquopy call through RecommenderRegistry
+        self._issue_cache_lock = threading.Lock()
         self.load_embeddings(embeddings_path)
         
     def load_embeddings(self, embeddings_path):
@@ -24,10 +45,59 @@ class YogaRecommender:
             with open(embeddings_path, 'rb') as f:
                 self.df = pickle.load(f)
             print(f"Loaded {len(self.df)} yoga poses with embeddings")
+            
+            # Stacked, unit-normalized contraindication embeddings for the batched filter
+            contra_emb = np.vstack(self.df["Contraindications_emb"].values).astype(np.float32)
+            norms = np.linalg.norm(contra_emb, axis=1, keepdims=True)
+            self.contra_emb = contra_emb / np.maximum(norms, 1e-12)
+            self.contra_text = np.array([str(text).lower() for text in self.df["Contraindications"]], dtype=str)
         except Exception as e:
             print(f"Error loading embeddings: {e}")
             self.df = None
     
+    def encode_issues(self, issues):
+        """
+        Embeddings for a list of issue strings, shape (len(issues), dim)
+        Issues not seen before are encoded together in one batch and cached
+        """
+        with self._issue_cache_lock:
+            found = {issue: self.issue_cache[issue] for issue in issues if issue in self.issue_cache}
+        
+        # Encoded outside the lock; the result is built from found, so another call's
+        # evictions can't remove an issue before it is read
+        missing = [issue for issue in dict.fromkeys(issues) if issue not in found]
+        if missing:
+            found.update(zip(missing, self.model.encode(missing, normalize_embeddings=True)))
+        
+        with self._issue_cache_lock:
+            for issue in issues:
+                self.issue_cache[issue] = found[issue]
+                self.issue_cache.move_to_end(issue)
+            while len(self.issue_cache) > ISSUE_CACHE_SIZE:
+                self.issue_cache.popitem(last=False)
+        return np.vstack([found[issue] for issue in issues])
+    
+    def contraindicated(self, issues):
+        """Boolean mask over all poses whose contraindications match any user issue"""
+        discard = np.zeros(len(self.df), dtype=bool)
+        issues = list(dict.fromkeys(issue.lower() for issue in issues))
+        if not issues:
+            return discard
+        
+        # Literal match
+        for issue in issues:
+            discard |= np.char.find(self.contra_text, issue) >= 0
+        
+        # Embedding similarity (LOW threshold = aggressive filtering)
+        remaining = np.flatnonzero(~discard)
+        if len(remaining):
+            issue_emb = self.encode_issues(issues)
+            issue_emb = issue_emb / np.maximum(np.linalg.norm(issue_emb, axis=1, keepdims=True), 1e-12)
+            similarity = issue_emb @ self.contra_emb[remaining].T
+            discard[remaining] = (similarity > CONTRA_THRESHOLD).any(axis=0)
+        
+        return discard
+    
     def get_recommendations(self, user_profile):
         """
         Get yoga pose recommendations based on user profile
@@ -56,30 +126,17 @@ class YogaRecommender:
         
         print(f"Processing {len(self.df)} yoga poses for recommendations...")
         
-        for i, row in self.df.iterrows():
-            score = 0.0
-            contra_text = str(row["Contraindications"]).lower()
-            
-            # Check contraindications exactly like in notebook
-            discard = False
-            for issue in user_profile.get("physical_issues", []) + user_profile.get("mental_issues", []):
-                issue = issue.lower()
-                
-                # Literal match
-                if issue in contra_text:
-                    discard = True
-                    break
-                
-                # Embedding similarity (LOW threshold = aggressive filtering)
-                issue_emb = self.model.encode(issue, normalize_embeddings=True)
-                similarity = util.cos_sim(issue_emb, row["Contraindications_emb"]).item()
-                if similarity > 0.25:
-                    discard = True
-                    break
-            
-            if discard:
+        # Check contraindications for all poses at once, exactly like the notebook's per-row check
+        discard = self.contraindicated(
+            user_profile.get("physical_issues", []) + user_profile.get("mental_issues", [])
+        )
+        
+        for pos, (i, row) in enumerate(self.df.iterrows()):
+            if discard[pos]:
                 continue
             
+            score = 0.0
+            
             # Main positive contributions - exactly like notebook
             score += weights["goals_benefits"] * util.cos_sim(user_emb["goals"], row["Benefits_emb"]).item()
             score += weights["physical_benefits"] * util.cos_sim(user_emb["physical_issues"], row["Benefits_emb"]).item()
@@ -101,10 +158,33 @@ class YogaRecommender:
                     "description": row.get("Description", "")
                 })
         
-        # Sort by descending score and return top recommendations
-        recommendations = sorted(recommendations, key=lambda x: x["score"], reverse=True)
         print(f"Generated {len(recommendations)} recommendations")
-        return recommendations[:10]  # Return top 10 recommendations
+        
+        # Top 10 recommendations by descending score; ties keep pose order
+        top_idx = top_k(np.array([rec["score"] for rec in recommendations]), 10)
+        return [recommendations[i] for i in top_idx]
+
+# Process-wide recommender instances, reused across calls from Kotlin
+_registry = RecommenderRegistry(YogaRecommender)
+
+def warm_up(embeddings_path):
+    """
+    Load the model and embeddings ahead of the first request
+    Called from the app lifecycle; returns whether the embeddings loaded
+    """
+    loaded = _registry.warm_up(embeddings_path)
+    # Run one encode so the first real request doesn't pay for lazy initialization
+    get_model().encode("warm up", normalize_embeddings=True)
+    return loaded
+
+def release(embeddings_path=None):
+    """
+    Free cached recommenders, e.g. when the app is backgrounded or low on memory
+    Releasing everything also drops the sentence transformer model
+    """
+    _registry.release(embeddings_path)
+    if embeddings_path is None:
+        get_model.cache_clear()
 
 def get_recommendations_for_user(user_profile_json, embeddings_path):
     """
@@ -118,8 +198,8 @@ def get_recommendations_for_user(user_profile_json, embeddings_path):
         user_profile = json.loads(user_profile_json)
         print(f"User profile: {user_profile}")
         
-        # Initialize recommender
-        recommender = YogaRecommender(embeddings_path)
+        # Reuse the process-wide recommender (reloaded if the embeddings file changed)
+        recommender = _registry.get(embeddings_path)
         
         # Get recommendations
         recommendations = recommender.get_recommendations(user_profile)
@@ -4,10 +4,101 @@ import pickle
 import os
 import json
 from typing import Dict, List, Optional
+from scipy import sparse
 
-# Global model cache
-_model_cache = None
-_embeddings_cache = None
+from ranking import top_k
+from recommender_registry import RecommenderRegistry
+
+TEXT_COLUMNS = ["Benefits", "Contraindications", "Targeted Physical Problems", "Targeted Mental Problems"]
+
+class JaccardScoringEngine:
+    """
+    Precomputed word-overlap scorer over the pose text columns
+    Builds a vocabulary and a sparse token-incidence matrix per column once,
+    so every pose is scored against a query in a few batched operations
+    """
+    def __init__(self, df: pd.DataFrame, columns: List[str] = TEXT_COLUMNS):
+        self.num_poses = len(df)
+        self.vocab = {}
+        self.incidence = {}
+        self.doc_sizes = {}
+        for column in columns:
+            self._index_column(column, [str(text) for text in df[column].tolist()])
+        
+        # Lowercased contraindication text for the literal substring pre-pass
+        self.contra_text = np.array([str(text).lower() for text in df["Contraindications"].tolist()], dtype=str)
+    
+    @staticmethod
+    def tokenize(text: str) -> set:
+        """Same tokenization as simple_text_similarity: lowercase, whitespace split, unique words"""
+        return set(text.lower().split()) if text else set()
+    
+    def _index_column(self, column: str, texts: List[str]):
+        """Build the vocabulary and pose x token incidence matrix for one column"""
+        vocab = {}
+        rows, cols = [], []
+        for row, text in enumerate(texts):
+            for token in self.tokenize(text):
+                rows.append(row)
+                cols.append(vocab.setdefault(token, len(vocab)))
+        
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+            shape=(self.num_poses, len(vocab)),
+        )
+        self.vocab[column] = vocab
+        self.incidence[column] = matrix
+        self.doc_sizes[column] = np.asarray(matrix.sum(axis=1)).ravel()
+    
+    def similarity_matrix(self, column: str, texts: List[str]) -> np.ndarray:
+        """
+        Jaccard similarity of each query text against every pose in a column
+        Returns an array of shape (len(texts), num_poses)
+        """
+        vocab = self.vocab[column]
+        query_tokens = [self.tokenize(text) for text in texts]
+        
+        # Tokens missing from the vocabulary never intersect but still count towards the union
+        rows, cols = [], []
+        for row, tokens in enumerate(query_tokens):
+            for token in tokens:
+                if token in vocab:
+                    rows.append(row)
+                    cols.append(vocab[token])
+        queries = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+            shape=(len(texts), len(vocab)),
+        )
+        
+        intersection = (queries @ self.incidence[column].T).toarray()
+        query_sizes = np.array([len(tokens) for tokens in query_tokens])[:, None]
+        doc_sizes = self.doc_sizes[column][None, :]
+        union = query_sizes + doc_sizes - intersection
+        
+        sims = np.zeros(intersection.shape, dtype=np.float64)
+        np.divide(intersection, union, out=sims, where=(query_sizes > 0) & (doc_sizes > 0))
+        return sims
+    
+    def similarity(self, column: str, text: str) -> np.ndarray:
+        """Jaccard similarity of one query text against every pose in a column"""
+        return self.similarity_matrix(column, [text])[0]
+    
+    def contraindicated(self, issues: List[str], threshold: float) -> np.ndarray:
+        """Boolean mask of poses whose contraindications match any of the user issues"""
+        discard = np.zeros(self.num_poses, dtype=bool)
+        if not issues:
+            return discard
+        
+        issues = list(dict.fromkeys(issue.lower() for issue in issues))
+        
+        # Literal match
+        for issue in issues:
+            discard |= np.char.find(self.contra_text, issue) >= 0
+        
+        # Simple similarity check
+        sims = self.similarity_matrix("Contraindications", issues)
+        discard |= (sims > threshold).any(axis=0)
+        return discard
 
 class OptimizedYogaRecommender:
     def __init__(self, embeddings_path: str):
@@ -17,23 +108,28 @@ class OptimizedYogaRecommender:
         """
         self.embeddings_path = embeddings_path
         self.df = None
+        self.engine = None
         self.load_embeddings(embeddings_path)
         
     def load_embeddings(self, embeddings_path: str):
         """Load the pre-computed embeddings from pickle file"""
-        global _embeddings_cache
-        
         try:
-            if _embeddings_cache is None:
-                with open(embeddings_path, 'rb') as f:
-                    _embeddings_cache = pickle.load(f)
-                print(f"Loaded {len(_embeddings_cache)} yoga poses with embeddings")
+            with open(embeddings_path, 'rb') as f:
+                self.df = pickle.load(f)
+            print(f"Loaded {len(self.df)} yoga poses with embeddings")
+            
+            self.engine = JaccardScoringEngine(self.df)
             
-            self.df = _embeddings_cache
+            self.names = self.df["AName"].tolist()
+            self.benefits = self.df["Benefits"].tolist()
+            self.contraindications = self.df["Contraindications"].tolist()
+            self.levels = self.df["Level"].tolist() if "Level" in self.df else ["Beginner"] * len(self.df)
+            self.descriptions = self.df["Description"].tolist() if "Description" in self.df else [""] * len(self.df)
             
         except Exception as e:
             print(f"Error loading embeddings: {e}")
             self.df = None
+            self.engine = None
     
     def simple_text_similarity(self, text1: str, text2: str) -> float:
         """
@@ -54,15 +150,25 @@ class OptimizedYogaRecommender:
         
         return len(intersection) / len(union) if union else 0.0
     
+    def _pose_record(self, i: int, score: float) -> Dict:
+        """Build the recommendation entry for the pose at position i"""
+        return {
+            "name": self.names[i],
+            "score": score,
+            "benefits": self.benefits[i],
+            "contraindications": self.contraindications[i],
+            "level": self.levels[i],
+            "description": self.descriptions[i]
+        }
+    
     def get_recommendations(self, user_profile: Dict) -> List[Dict]:
         """
         Get yoga pose recommendations based on user profile
         Uses simple text similarity instead of sentence transformers
         """
-        if self.df is None:
+        if self.df is None or self.engine is None:
             return []
         
-        recommendations = []
         weights = {
             "goals_benefits": 4,
             "physical_benefits": 4,
@@ -77,59 +183,50 @@ class OptimizedYogaRecommender:
         user_physical_text = " ".join(user_profile.get("physical_issues", []))
         user_mental_text = " ".join(user_profile.get("mental_issues", []))
         
-        for i, row in self.df.iterrows():
-            score = 0.0
-            contra_text = str(row["Contraindications"]).lower()
-            
-            # Check contraindications using simple text matching
-            discard = False
-            for issue in user_profile.get("physical_issues", []) + user_profile.get("mental_issues", []):
-                issue = issue.lower()
-                
-                # Literal match
-                if issue in contra_text:
-                    discard = True
-                    break
-                
-                # Simple similarity check
-                if self.simple_text_similarity(issue, contra_text) > 0.3:
-                    discard = True
-                    break
-            
-            if discard:
-                continue
-            
-            # Calculate similarities using simple text matching
-            goals_similarity = self.simple_text_similarity(user_goals_text, str(row["Benefits"]))
-            physical_similarity = self.simple_text_similarity(user_physical_text, str(row["Benefits"]))
-            mental_similarity = self.simple_text_similarity(user_mental_text, str(row["Benefits"]))
-            
-            physical_match_similarity = self.simple_text_similarity(user_physical_text, str(row["Targeted Physical Problems"]))
-            mental_match_similarity = self.simple_text_similarity(user_mental_text, str(row["Targeted Mental Problems"]))
-            
-            # Main positive contributions
-            score += weights["goals_benefits"] * goals_similarity
-            score += weights["physical_benefits"] * physical_similarity
-            score += weights["mental_benefits"] * mental_similarity
-            score += weights["physical_match"] * physical_match_similarity
-            score += weights["mental_match"] * mental_match_similarity
-            
-            # Normalize
-            score /= total_weight
-            
-            if score > 0:
-                recommendations.append({
-                    "name": row["AName"],
-                    "score": round(score, 3),
-                    "benefits": row["Benefits"],
-                    "contraindications": row["Contraindications"],
-                    "level": row.get("Level", "Beginner"),
-                    "description": row.get("Description", "")
-                })
-        
-        # Sort by descending score and return top recommendations
-        recommendations = sorted(recommendations, key=lambda x: x["score"], reverse=True)
-        return recommendations[:10]  # Return top 10 recommendations
+        # Check contraindications for all poses at once
+        issues = user_profile.get("physical_issues", []) + user_profile.get("mental_issues", [])
+        discard = self.engine.contraindicated(issues, threshold=0.3)
+        
+        # Calculate similarities for all poses at once
+        goals_similarity = self.engine.similarity("Benefits", user_goals_text)
+        physical_similarity = self.engine.similarity("Benefits", user_physical_text)
+        mental_similarity = self.engine.similarity("Benefits", user_mental_text)
+        
+        physical_match_similarity = self.engine.similarity("Targeted Physical Problems", user_physical_text)
+        mental_match_similarity = self.engine.similarity("Targeted Mental Problems", user_mental_text)
+        
+        # Main positive contributions, accumulated in the same order as the per-row loop
+        scores = weights["goals_benefits"] * goals_similarity
+        scores = scores + weights["physical_benefits"] * physical_similarity
+        scores = scores + weights["mental_benefits"] * mental_similarity
+        scores = scores + weights["physical_match"] * physical_match_similarity
+        scores = scores + weights["mental_match"] * mental_match_similarity
+        
+        # Normalize
+        scores = scores / total_weight
+        
+        candidates = np.flatnonzero(~discard & (scores > 0))
+        rounded = np.array([round(float(scores[i]), 3) for i in candidates])
+        
+        # Top recommendations by descending rounded score; ties keep pose order
+        return [
+            self._pose_record(int(candidates[j]), float(rounded[j]))
+            for j in top_k(rounded, 10)
+        ]
+
+# Process-wide recommender instances, reused across calls from Kotlin
+_registry = RecommenderRegistry(OptimizedYogaRecommender)
+
+def warm_up(embeddings_path: str) -> bool:
+    """
+    Load the embeddings and build the scoring engine ahead of the first request
+    Called from the app lifecycle; returns whether the embeddings loaded
+    """
+    return _registry.warm_up(embeddings_path)
+
+def release(embeddings_path: Optional[str] = None):
+    """Free cached recommenders, e.g. when the app is backgrounded or low on memory"""
+    _registry.release(embeddings_path)
 
 def get_recommendations_for_user(user_profile_json: str, embeddings_path: str) -> str:
     """
@@ -140,8 +237,8 @@ def get_recommendations_for_user(user_profile_json: str, embeddings_path: str) -
         # Parse user profile
         user_profile = json.loads(user_profile_json)
         
-        # Initialize recommender
-        recommender = OptimizedYogaRecommender(embeddings_path)
+        # Reuse the process-wide recommender (reloaded if the embeddings file changed)
+        recommender = _registry.get(embeddings_path)
         
         # Get recommendations
         recommendations = recommender.get_recommendations(user_profile)
@@ -0,0 +1,58 @@
+"""
+Offline pose analysis for recorded landmark sessions
+
+Headless counterparts of the calibration notebook, for batches of frames
+rather than one webcam frame at a time.
+"""
+
+from .angles import (
+    ANGLE_DEFINITIONS,
+    JOINTS,
+    NUM_LANDMARKS,
+    AngleEngine,
+    calculate_angle,
+    joint_angles,
+    joint_column,
+    joint_name,
+    stream_joint_angles,
+)
+from .classifier import Classification, PoseClassifier, classify_windows
+from .reference import DEFAULT_POSES_PATH, PoseReference, load_reference, match_pose_name, normalize_pose_name
+from .scoring import PoseScorer, compare, score_session
+from .sessions import AngleChunk, read_session
+from .smoothing import EMASmoother, FeedbackStage, HoldDetector, OneEuroFilter, RingBuffer
+from .thresholds import AngleHistogram, Calibration, write_poses_json, write_thresholds_csv
+
+__all__ = [
+    "ANGLE_DEFINITIONS",
+    "DEFAULT_POSES_PATH",
+    "JOINTS",
+    "NUM_LANDMARKS",
+    "AngleChunk",
+    "AngleEngine",
+    "AngleHistogram",
+    "Calibration",
+    "Classification",
+    "EMASmoother",
+    "FeedbackStage",
+    "HoldDetector",
+    "OneEuroFilter",
+    "PoseClassifier",
+    "PoseReference",
+    "PoseScorer",
+    "RingBuffer",
+    "calculate_angle",
+    "classify_windows",
+    "compare",
+    "joint_angles",
+    "joint_column",
+    "joint_name",
+    "load_reference",
+    "match_pose_name",
+    "normalize_pose_name",
+    "read_session",
+    "score_session",
+    "stream_joint_angles",
+    "write_poses_json",
+    "write_thresholds_csv",
+]
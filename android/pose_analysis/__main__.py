@@ -0,0 +1,30 @@
+"""
+Command line entry point
+
+    python -m pose_analysis score SESSION... [--pose NAME] [--timeline PATH]
+    python -m pose_analysis classify SESSION... [--window FRAMES]
+    python -m pose_analysis events SESSION... --pose NAME [--filter one-euro|ema|none]
+    python -m pose_analysis calibrate DIR... [--manifest CSV] --out-json JSON --out-csv CSV
+"""
+
+import sys
+
+from . import classifier, scoring, smoothing, thresholds
+
+COMMANDS = {
+    "score": scoring.main,
+    "classify": classifier.main,
+    "events": smoothing.main,
+    "calibrate": thresholds.main,
+}
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+        print(f"usage: python -m pose_analysis {{{','.join(COMMANDS)}}} ...", file=sys.stderr)
+        sys.exit(2)
+    COMMANDS[sys.argv[1]](sys.argv[2:])
+
+
+if __name__ == "__main__":
+    main()
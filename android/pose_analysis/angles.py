@@ -0,0 +1,139 @@
+"""
+Vectorized joint angles from pose landmarks
+
+Computes the eight joint angles of the calibration notebook for a whole
+(frames x 33 landmarks x 2+) array at once, instead of one calculate_angle()
+call per joint per frame. The arithmetic is the notebook's, in float64 and in
+the same order, so every angle matches calculate_angle() exactly, including
+the wraparound of angles above 180 degrees.
+
+Landmarks use the MediaPipe / ML Kit 33-point indexing; only x and y are
+read, so (x, y), (x, y, z) and (x, y, z, visibility) layouts all work. A
+missing landmark given as NaN yields NaN for the joints that use it.
+"""
+
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+NUM_LANDMARKS = 33
+
+# MediaPipe PoseLandmark indices used by the angle definitions
+LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+LEFT_ELBOW, RIGHT_ELBOW = 13, 14
+LEFT_WRIST, RIGHT_WRIST = 15, 16
+LEFT_HIP, RIGHT_HIP = 23, 24
+LEFT_KNEE, RIGHT_KNEE = 25, 26
+LEFT_ANKLE, RIGHT_ANKLE = 27, 28
+
+# Joints in yoga_poses.json order; the angle is measured at the middle landmark
+ANGLE_DEFINITIONS: Dict[str, Tuple[int, int, int]] = {
+    "left_knee": (LEFT_HIP, LEFT_KNEE, LEFT_ANKLE),
+    "right_knee": (RIGHT_HIP, RIGHT_KNEE, RIGHT_ANKLE),
+    "left_elbow": (LEFT_SHOULDER, LEFT_ELBOW, LEFT_WRIST),
+    "right_elbow": (RIGHT_SHOULDER, RIGHT_ELBOW, RIGHT_WRIST),
+    "left_shoulder": (LEFT_HIP, LEFT_SHOULDER, LEFT_ELBOW),
+    "right_shoulder": (RIGHT_HIP, RIGHT_SHOULDER, RIGHT_ELBOW),
+    "left_hip": (LEFT_SHOULDER, LEFT_HIP, LEFT_KNEE),
+    "right_hip": (RIGHT_SHOULDER, RIGHT_HIP, RIGHT_KNEE),
+}
+JOINTS: Tuple[str, ...] = tuple(ANGLE_DEFINITIONS)
+
+
+def joint_column(joint: str) -> str:
+    """Name the notebook, pose_thresholds.csv and the app use for a joint, e.g. left_knee_angle"""
+    return f"{joint}_angle"
+
+
+def joint_name(column: str) -> str:
+    """Inverse of joint_column(); names without the suffix pass through"""
+    return column[: -len("_angle")] if column.endswith("_angle") else column
+
+
+def calculate_angle(a, b, c) -> float:
+    """The notebook's per-angle reference implementation, kept for checking joint_angles()"""
+    a = np.array(a)
+    b = np.array(b)
+    c = np.array(c)
+    radians = np.arctan2(c[1] - b[1], c[0] - b[0]) - np.arctan2(a[1] - b[1], a[0] - b[0])
+    angle = np.abs(radians * 180.0 / np.pi)
+    if angle > 180.0:
+        angle = 360 - angle
+    return angle
+
+
+class AngleEngine:
+    """
+    Joint angles for batches of frames, reusing its scratch buffers across calls
+    Buffers grow to the largest chunk seen, so a stream of equally sized chunks
+    allocates only for the returned angles.
+    """
+
+    def __init__(self, joints: Sequence[str] = JOINTS):
+        unknown = [joint for joint in joints if joint not in ANGLE_DEFINITIONS]
+        if unknown:
+            raise ValueError(f"Unknown joints: {', '.join(unknown)} (expected some of {', '.join(JOINTS)})")
+        self.joints = tuple(joints)
+        triples = np.array([ANGLE_DEFINITIONS[joint] for joint in self.joints], dtype=np.intp)
+        self._a, self._b, self._c = triples[:, 0], triples[:, 1], triples[:, 2]
+        self._capacity = 0
+
+    def _reserve(self, frames: int):
+        if frames > self._capacity:
+            shape = (frames, len(self.joints))
+            self._ab = np.empty(shape + (2,), dtype=np.float64)
+            self._cb = np.empty(shape + (2,), dtype=np.float64)
+            self._theta = np.empty(shape, dtype=np.float64)
+            self._capacity = frames
+
+    def compute(self, landmarks: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Angles in degrees, shape (frames, joints); a single (33, k) frame gives shape (joints,)
+        Pass `out` to write into an existing (frames, joints) float64 array
+        """
+        landmarks = np.asarray(landmarks)
+        single = landmarks.ndim == 2
+        if single:
+            landmarks = landmarks[None]
+        if landmarks.ndim != 3 or landmarks.shape[1] != NUM_LANDMARKS or landmarks.shape[2] < 2:
+            raise ValueError(f"Expected landmarks of shape (frames, {NUM_LANDMARKS}, 2+), got {landmarks.shape}")
+
+        frames = len(landmarks)
+        self._reserve(frames)
+        xy = landmarks[..., :2]
+        ab, cb, theta = self._ab[:frames], self._cb[:frames], self._theta[:frames]
+        if out is None:
+            out = np.empty((frames, len(self.joints)), dtype=np.float64)
+
+        # (a - b) and (c - b) for every joint; float32 input is widened first, like float(x) in the notebook
+        b = xy[:, self._b].astype(np.float64, copy=False)
+        np.subtract(xy[:, self._a], b, out=ab)
+        np.subtract(xy[:, self._c], b, out=cb)
+
+        # arctan2(c - b) - arctan2(a - b), then |radians * 180 / pi| with the same operation order
+        np.arctan2(cb[..., 1], cb[..., 0], out=out)
+        np.arctan2(ab[..., 1], ab[..., 0], out=theta)
+        np.subtract(out, theta, out=out)
+        np.multiply(out, 180.0, out=out)
+        np.divide(out, np.pi, out=out)
+        np.abs(out, out=out)
+
+        # Reflex angles wrap to 360 - angle, as in the notebook
+        np.subtract(360.0, out, out=theta)
+        np.copyto(out, theta, where=out > 180.0)
+        return out[0] if single else out
+
+    def stream(self, chunks: Iterable[np.ndarray]) -> Iterator[np.ndarray]:
+        """Angles for each (frames, 33, k) chunk of a recorded session, in order"""
+        for chunk in chunks:
+            yield self.compute(chunk)
+
+
+def joint_angles(landmarks: np.ndarray, joints: Sequence[str] = JOINTS) -> np.ndarray:
+    """Angles in degrees for (frames, 33, k) landmarks, shape (frames, joints); see AngleEngine"""
+    return AngleEngine(joints).compute(landmarks)
+
+
+def stream_joint_angles(chunks: Iterable[np.ndarray], joints: Sequence[str] = JOINTS) -> Iterator[np.ndarray]:
+    """Angles for each chunk of landmarks, with one engine (and its buffers) for the whole stream"""
+    return AngleEngine(joints).stream(chunks)
@@ -0,0 +1,179 @@
+"""
+Pose classification against the reference angle vectors of yoga_poses.json
+
+Nearest centroid over the 8 joint angles, with each joint's difference from
+a pose measured in that pose's tolerance band:
+
+    d(frame, pose) = mean over visible joints of ((angle - reference) / deviation)^2
+
+Expanding the square turns every distance into one matrix product:
+[x^2 * m, x * m, m] (frames x 3 joints, m the visibility mask) times a
+matrix precomputed from the references (3 joints x poses). A whole chunk of
+frames is classified with one GEMM and an argmin, which costs microseconds
+per frame on a CPU. Invisible joints drop out of both the sum and the mean.
+
+Each pose is also matched mirrored (left and right joints swapped), so a
+pose held on the other side is still recognized. sqrt(d) is the RMS
+deviation in tolerance bands: 1.0 means the joints sit on average at the
+edge of the band. Frames further than `max_distance` from every pose are
+labelled -1 (no pose). Confidence is the softmax probability of the best
+pose over all poses, with logits -d / (2 * temperature^2).
+
+    python -m pose_analysis classify session.npz --window 30
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+
+from .reference import DEFAULT_POSES_PATH, PoseReference, load_reference
+from .sessions import DEFAULT_CHUNK_SIZE, AngleChunk, read_session
+
+
+class Classification(NamedTuple):
+    poses: np.ndarray        # (n,) index into reference.names, -1 when no pose is within max_distance
+    distances: np.ndarray    # (n,) RMS deviation from the best pose, in tolerance bands
+    confidence: np.ndarray   # (n,) softmax probability of the best pose
+
+
+def mirrored_joints(joints) -> List[int]:
+    """For each joint, the position of its left/right counterpart"""
+    swap = {"left_": "right_", "right_": "left_"}
+    mirrored = []
+    for joint in joints:
+        side = next((prefix for prefix in swap if joint.startswith(prefix)), None)
+        mirrored.append(joints.index(swap[side] + joint[len(side):]) if side else joints.index(joint))
+    return mirrored
+
+
+class PoseClassifier:
+    def __init__(
+        self,
+        reference: PoseReference,
+        mirror: bool = True,
+        temperature: float = 1.0,
+        max_distance: float = 2.0,
+    ):
+        self.reference = reference
+        self.mirror = mirror
+        self.temperature = temperature
+        self.max_distance = max_distance
+
+        centroids, weights = reference.angles, 1.0 / np.square(reference.deviations)
+        if mirror:
+            swap = mirrored_joints(list(reference.joints))
+            centroids = np.vstack([centroids, centroids[:, swap]])
+            weights = np.vstack([weights, weights[:, swap]])
+
+        # sum_j m w (x - r)^2 = [x^2 m, x m, m] . [w, -2 w r, w r^2]
+        self._matrix = np.ascontiguousarray(
+            np.hstack([weights, -2.0 * weights * centroids, weights * np.square(centroids)]).T
+        )
+
+    def distances(self, angles: np.ndarray) -> np.ndarray:
+        """Mean squared deviation in tolerance bands from every pose, shape (frames, poses)"""
+        angles = np.atleast_2d(np.asarray(angles, dtype=np.float64))
+        visible = ~np.isnan(angles)
+        x = np.where(visible, angles, 0.0)
+        features = np.hstack([x * x, x, visible.astype(np.float64)])
+
+        d = features @ self._matrix
+        counts = visible.sum(axis=1, keepdims=True)
+        d /= np.maximum(counts, 1)
+        # Guards against tiny negative values from cancellation in the expanded square
+        np.maximum(d, 0.0, out=d)
+        if self.mirror:
+            poses = len(self.reference)
+            d = np.minimum(d[:, :poses], d[:, poses:])
+        d[counts[:, 0] == 0] = np.inf
+        return d
+
+    def _decide(self, d: np.ndarray) -> Classification:
+        rows = np.arange(len(d))
+        best = np.argmin(d, axis=1)
+        best_d = d[rows, best]
+
+        logits = -0.5 * d / self.temperature ** 2
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        confidence = probabilities[rows, best] / probabilities.sum(axis=1)
+
+        rms = np.sqrt(best_d)
+        known = rms <= self.max_distance
+        return Classification(np.where(known, best, -1), rms, np.where(known, confidence, 0.0))
+
+    def classify(self, angles: np.ndarray) -> Classification:
+        """Most likely pose per frame, for (frames, joints) angles or a single (joints,) frame"""
+        return self._decide(self.distances(angles))
+
+    def classify_window(self, angles: np.ndarray) -> Classification:
+        """One decision for a window of frames, from its mean distance to each pose; length-1 arrays"""
+        d = self.distances(angles)
+        seen = np.isfinite(d[:, 0])
+        mean = d[seen].mean(axis=0, keepdims=True) if seen.any() else np.full((1, d.shape[1]), np.inf)
+        return self._decide(mean)
+
+    def top_k(self, angles: np.ndarray, k: int = 3):
+        """The k most likely poses per frame and their RMS distances, each of shape (frames, k)"""
+        d = self.distances(angles)
+        k = min(k, d.shape[1])
+        ids = np.argpartition(d, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(d, ids, axis=1), axis=1, kind="stable")
+        ids = np.take_along_axis(ids, order, axis=1)
+        return ids, np.sqrt(np.take_along_axis(d, ids, axis=1))
+
+    def pose_name(self, pose: int) -> Optional[str]:
+        return self.reference.names[pose] if pose >= 0 else None
+
+
+def classify_windows(chunks: Iterable[AngleChunk], classifier: PoseClassifier, window: int) -> Iterator[Dict]:
+    """One classification per `window` consecutive frames of a session; the last window may be shorter"""
+    pending_angles = np.empty((0, len(classifier.reference.joints)))
+    pending_frames = np.empty(0, dtype=np.int64)
+
+    def decide(angles, frames):
+        result = classifier.classify_window(angles)
+        return {
+            "start_frame": int(frames[0]),
+            "end_frame": int(frames[-1]),
+            "pose": classifier.pose_name(int(result.poses[0])),
+            "distance": round(float(result.distances[0]), 3),
+            "confidence": round(float(result.confidence[0]), 4),
+        }
+
+    for chunk in chunks:
+        pending_angles = np.vstack([pending_angles, chunk.angles])
+        pending_frames = np.concatenate([pending_frames, chunk.frames])
+        full = len(pending_angles) // window * window
+        for start in range(0, full, window):
+            yield decide(pending_angles[start:start + window], pending_frames[start:start + window])
+        pending_angles, pending_frames = pending_angles[full:], pending_frames[full:]
+    if len(pending_angles):
+        yield decide(pending_angles, pending_frames)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m pose_analysis classify", description="Label recorded sessions with the most likely pose"
+    )
+    parser.add_argument("sessions", nargs="+", help="CSV, NPZ, NPY or JSONL session files")
+    parser.add_argument("--window", type=int, default=30, help="frames per decision")
+    parser.add_argument("--poses-json", default=DEFAULT_POSES_PATH)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--max-distance", type=float, default=2.0, help="RMS tolerance bands beyond which no pose is reported")
+    parser.add_argument("--temperature", type=float, default=1.0)
+    parser.add_argument("--no-mirror", action="store_true", help="don't match poses held on the other side")
+    args = parser.parse_args(argv)
+
+    classifier = PoseClassifier(
+        load_reference(args.poses_json),
+        mirror=not args.no_mirror,
+        temperature=args.temperature,
+        max_distance=args.max_distance,
+    )
+    for path in args.sessions:
+        for decision in classify_windows(read_session(path, args.chunk_size), classifier, args.window):
+            sys.stdout.write(json.dumps({"session": path, **decision}) + "\n")
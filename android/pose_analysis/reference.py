@@ -0,0 +1,90 @@
+"""
+Reference angles and tolerance bands from yoga_poses.json
+
+Each pose has a reference angle and an allowed deviation per joint; a joint
+passes when its angle lies within reference +/- deviation, clamped to
+[0, 180] degrees, the same band YogaPoseLoader.calculateThresholds() and
+clampToPoseAngleDomain() give the app. All poses are held as (poses x joints)
+matrices in JOINTS order so a frame is compared with every pose at once.
+"""
+
+import json
+import os
+import re
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .angles import JOINTS
+
+DEFAULT_POSES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "yoga_poses.json")
+
+# YogaPoseLoader's default when a joint has no deviation
+DEFAULT_DEVIATION = 10.0
+
+
+def normalize_pose_name(name: str) -> str:
+    """Lowercase, punctuation dropped, whitespace collapsed (first step of the app's normalizePoseName)"""
+    return " ".join(re.sub(r"[^a-z0-9\s]", "", name.lower()).split())
+
+
+def match_pose_name(names: Sequence[str], name: str) -> int:
+    """
+    Position in names of a pose by its exact name, its normalized name, or a
+    unique normalized prefix, so "Dandasana" finds "Dandasana (Staff) Pose"
+    """
+    names = list(names)
+    if name in names:
+        return names.index(name)
+    normalized = [normalize_pose_name(n) for n in names]
+    wanted = normalize_pose_name(name)
+    if wanted in normalized:
+        return normalized.index(wanted)
+    matches = [i for i, n in enumerate(normalized) if wanted and n.startswith(wanted)]
+    if len(matches) == 1:
+        return matches[0]
+    raise KeyError(f"No single pose matches {name!r}; poses are: {', '.join(names)}")
+
+
+class PoseReference:
+    def __init__(self, names: Sequence[str], angles: np.ndarray, deviations: np.ndarray, joints: Sequence[str] = JOINTS):
+        self.names: List[str] = list(names)
+        self.joints = tuple(joints)
+        self.angles = np.asarray(angles, dtype=np.float64)
+        self.deviations = np.asarray(deviations, dtype=np.float64)
+        expected = (len(self.names), len(self.joints))
+        if self.angles.shape != expected or self.deviations.shape != expected:
+            raise ValueError(f"Expected reference angles and deviations of shape {expected}")
+
+        self.min_angles = np.clip(self.angles - self.deviations, 0.0, 180.0)
+        self.max_angles = np.clip(self.angles + self.deviations, 0.0, 180.0)
+
+    @classmethod
+    def from_json(cls, path: str = DEFAULT_POSES_PATH) -> "PoseReference":
+        with open(path) as f:
+            poses = json.load(f)["poses"]
+        return cls(
+            [pose["pose_name"] for pose in poses],
+            [[pose["reference_angles"].get(joint, np.nan) for joint in JOINTS] for pose in poses],
+            [[pose.get("deviations", {}).get(joint, DEFAULT_DEVIATION) for joint in JOINTS] for pose in poses],
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def index(self, name: str) -> int:
+        """Position of a pose by its exact name, its normalized name, or a unique normalized prefix"""
+        return match_pose_name(self.names, name)
+
+    def select(self, names: Optional[Sequence[str]] = None) -> "PoseReference":
+        """The reference restricted to some poses, in the order given; all of them for None"""
+        if names is None:
+            return self
+        rows = [self.index(name) for name in names]
+        return PoseReference(
+            [self.names[i] for i in rows], self.angles[rows], self.deviations[rows], self.joints
+        )
+
+
+def load_reference(path: str = DEFAULT_POSES_PATH, poses: Optional[Sequence[str]] = None) -> PoseReference:
+    return PoseReference.from_json(path).select(poses)
@@ -0,0 +1,212 @@
+"""
+Headless scoring of recorded sessions against yoga_poses.json
+
+Each chunk of frames is compared with every selected pose in one broadcast
+over a (frames x poses x joints) tensor, so scoring all 22 poses costs one
+array operation per chunk rather than a Python loop per pose and frame.
+Statistics accumulate chunk by chunk, so sessions larger than RAM stream in
+constant memory (plus the timeline segments, when requested).
+
+    python -m pose_analysis score session.csv --pose Dandasana
+    python -m pose_analysis score sessions/*.npz --timeline timeline.jsonl --summary summary.jsonl
+
+Per session, the summary gives for each pose the share of frames where every
+joint is within its band, the longest such hold, and per joint the pass rate,
+the mean absolute deviation from the reference angle and the frames where the
+joint was not visible. The timeline is run-length encoded: one segment per
+stretch of frames where a joint of a pose stays passing, failing or missing.
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .reference import DEFAULT_POSES_PATH, PoseReference, load_reference
+from .sessions import DEFAULT_CHUNK_SIZE, AngleChunk, read_session
+
+# Joint states in timelines
+FAIL, PASS, MISSING = 0, 1, 2
+STATE_NAMES = {FAIL: "fail", PASS: "pass", MISSING: "missing"}
+
+
+def compare(angles: np.ndarray, reference: PoseReference):
+    """
+    Pass mask and absolute deviation of (frames, joints) angles against every reference pose
+    Both have shape (frames, poses, joints); NaN angles fail and have NaN deviation
+    """
+    angles = angles[:, None, :]
+    passed = (angles >= reference.min_angles) & (angles <= reference.max_angles)
+    deviation = np.abs(angles - reference.angles)
+    return passed, deviation
+
+
+class PoseScorer:
+    """Accumulates per-pose, per-joint statistics (and optionally timelines) over streamed chunks"""
+
+    def __init__(self, reference: PoseReference, timelines: bool = False):
+        self.reference = reference
+        self.timelines = timelines
+        poses, joints = len(reference), len(reference.joints)
+
+        self.frames = 0
+        self.first_time: Optional[float] = None
+        self.last_time: Optional[float] = None
+        self.passed = np.zeros((poses, joints), dtype=np.int64)
+        self.missing = np.zeros(joints, dtype=np.int64)
+        self.deviation_sum = np.zeros((poses, joints), dtype=np.float64)
+        self.all_passed = np.zeros(poses, dtype=np.int64)
+
+        # Current and longest run of frames with every joint passing, per pose
+        self.hold = np.zeros(poses, dtype=np.int64)
+        self.longest_hold = np.zeros(poses, dtype=np.int64)
+
+        # Open timeline segment per pose and joint
+        self._state = np.full((poses, joints), -1, dtype=np.int8)
+        self._since_frame = np.zeros((poses, joints), dtype=np.int64)
+        self._since_time = np.full((poses, joints), np.nan)
+        self._last_frame = -1
+
+    def update(self, chunk: AngleChunk) -> List[Dict]:
+        """Score a chunk; returns the timeline segments it closed (empty unless timelines are on)"""
+        n = len(chunk.angles)
+        if not n:
+            return []
+        passed, deviation = compare(chunk.angles, self.reference)
+        missing = np.isnan(chunk.angles)
+
+        self.frames += n
+        self.passed += passed.sum(axis=0)
+        self.missing += missing.sum(axis=0)
+        self.deviation_sum += np.nansum(deviation, axis=0)
+
+        all_passed = passed.all(axis=2)
+        self.all_passed += all_passed.sum(axis=0)
+        self._update_holds(all_passed)
+
+        if chunk.timestamps is not None:
+            if self.first_time is None:
+                self.first_time = float(chunk.timestamps[0])
+            self.last_time = float(chunk.timestamps[-1])
+
+        segments = []
+        if self.timelines:
+            state = np.where(missing[:, None, :], MISSING, passed.astype(np.int8)).astype(np.int8)
+            segments = self._update_timelines(chunk, state)
+        self._last_frame = int(chunk.frames[-1])
+        return segments
+
+    def _update_holds(self, all_passed: np.ndarray):
+        # Run length ending at each frame, continuing the run carried over from the previous chunk
+        t = np.arange(len(all_passed))[:, None]
+        last_fail = np.maximum.accumulate(np.where(all_passed, -1, t), axis=0)
+        runs = np.where(last_fail >= 0, t - last_fail, t + 1 + self.hold)
+        self.longest_hold = np.maximum(self.longest_hold, runs.max(axis=0))
+        self.hold = runs[-1]
+
+    def _update_timelines(self, chunk: AngleChunk, state: np.ndarray) -> List[Dict]:
+        previous = np.concatenate([self._state[None], state[:-1]])
+        segments = []
+        # np.nonzero walks frames in order, so segments close in time order
+        for t, p, j in zip(*np.nonzero(state != previous)):
+            old = self._state[p, j]
+            if old >= 0:
+                end_frame = int(chunk.frames[t - 1]) if t else self._last_frame
+                segments.append(self._segment(p, j, old, end_frame))
+            self._state[p, j] = state[t, p, j]
+            self._since_frame[p, j] = chunk.frames[t]
+            self._since_time[p, j] = chunk.timestamps[t] if chunk.timestamps is not None else np.nan
+        return segments
+
+    def _segment(self, p: int, j: int, state: int, end_frame: int) -> Dict:
+        segment = {
+            "pose": self.reference.names[p],
+            "joint": self.reference.joints[j],
+            "state": STATE_NAMES[int(state)],
+            "start_frame": int(self._since_frame[p, j]),
+            "end_frame": end_frame,
+        }
+        if not np.isnan(self._since_time[p, j]):
+            segment["start_s"] = float(self._since_time[p, j])
+        return segment
+
+    def finish(self) -> List[Dict]:
+        """Close the open timeline segments at the last frame"""
+        if not self.timelines:
+            return []
+        segments = [
+            self._segment(p, j, self._state[p, j], self._last_frame)
+            for p, j in zip(*np.nonzero(self._state >= 0))
+        ]
+        self._state[:] = -1
+        return segments
+
+    def summary(self) -> Dict:
+        frames = max(self.frames, 1)
+        visible = np.maximum(self.frames - self.missing, 1)
+        poses = []
+        for p, name in enumerate(self.reference.names):
+            poses.append({
+                "pose": name,
+                "pass_rate": round(float(self.all_passed[p] / frames), 4),
+                "longest_hold_frames": int(self.longest_hold[p]),
+                "joints": {
+                    joint: {
+                        "pass_rate": round(float(self.passed[p, j] / visible[j]), 4),
+                        "mean_abs_deviation": round(float(self.deviation_sum[p, j] / visible[j]), 2),
+                        "missing_frames": int(self.missing[j]),
+                    }
+                    for j, joint in enumerate(self.reference.joints)
+                },
+            })
+        summary = {"frames": self.frames, "poses": poses}
+        if self.first_time is not None:
+            summary["duration_s"] = round(self.last_time - self.first_time, 3)
+        return summary
+
+
+def score_session(chunks: Iterable[AngleChunk], reference: PoseReference, timeline=None) -> Dict:
+    """
+    Score a stream of chunks; timeline segments are passed to `timeline` (a callable) as they close
+    Returns the summary
+    """
+    scorer = PoseScorer(reference, timelines=timeline is not None)
+    for chunk in chunks:
+        for segment in scorer.update(chunk):
+            timeline(segment)
+    for segment in scorer.finish():
+        timeline(segment)
+    return scorer.summary()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m pose_analysis score", description="Score recorded pose sessions against yoga_poses.json"
+    )
+    parser.add_argument("sessions", nargs="+", help="CSV, NPZ, NPY or JSONL session files")
+    parser.add_argument("--pose", action="append", help="pose to score against (repeatable); all poses by default")
+    parser.add_argument("--poses-json", default=DEFAULT_POSES_PATH)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--timeline", help="write per-joint pass/fail segments to this JSONL file")
+    parser.add_argument("--summary", help="write summaries to this JSONL file instead of stdout")
+    args = parser.parse_args(argv)
+
+    reference = load_reference(args.poses_json, args.pose)
+    timeline_file = open(args.timeline, "w") if args.timeline else None
+    summary_file = open(args.summary, "w") if args.summary else sys.stdout
+    try:
+        for path in args.sessions:
+            write_segment = None
+            if timeline_file is not None:
+                def write_segment(segment, path=path):
+                    timeline_file.write(json.dumps({"session": path, **segment}) + "\n")
+            summary = score_session(read_session(path, args.chunk_size), reference, write_segment)
+            summary_file.write(json.dumps({"session": path, **summary}) + "\n")
+    finally:
+        if timeline_file is not None:
+            timeline_file.close()
+        if summary_file is not sys.stdout:
+            summary_file.close()
+
@@ -0,0 +1,240 @@
+"""
+Streaming readers for recorded landmark sessions
+
+Every reader yields AngleChunks of at most `chunk_size` frames, so a session
+is never loaded whole and files larger than RAM stream in constant memory.
+Sessions hold either raw landmarks, turned into joint angles on the fly, or
+joint angles that were already computed.
+
+    CSV     one row per frame; landmark columns x0..x32 and y0..y32 (also
+            x_0, 0_x, landmark_0_x; z and visibility are ignored), or one
+            column per joint (left_knee or left_knee_angle); optional
+            frame and timestamp (seconds) columns. Needs pandas.
+    NPZ     arrays "landmarks" (frames, 33, k) or "angles" (frames, 8, in
+            JOINTS order), optional "timestamps"; members are read
+            incrementally, compressed or not. A bare .npy of landmarks or
+            angles is memory-mapped.
+    JSONL   one object per frame: {"landmarks": [[x, y, ...] x 33]} or
+            {"angles": {"left_knee": ..., ...}}, optional "frame" and
+            "timestamp"; "landmarks": null marks a frame with no person.
+
+Angles a session is missing (no person detected, absent joint columns) are NaN.
+"""
+
+import contextlib
+import json
+import os
+import re
+import zipfile
+from typing import IO, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+
+from .angles import JOINTS, NUM_LANDMARKS, AngleEngine, joint_column
+
+DEFAULT_CHUNK_SIZE = 4096
+
+SESSION_FORMATS = {
+    ".csv": "csv",
+    ".npz": "npz",
+    ".npy": "npy",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+}
+
+_LANDMARK_COLUMN = re.compile(r"^(?:landmark_?)?(?:([xy])_?(\d+)|(\d+)_?([xy]))$", re.IGNORECASE)
+
+
+class AngleChunk(NamedTuple):
+    frames: np.ndarray                  # frame indices, (n,)
+    timestamps: Optional[np.ndarray]    # seconds, (n,), when the session records them
+    angles: np.ndarray                  # degrees, (n, joints) in JOINTS order
+
+
+def _chunk(start: int, angles: np.ndarray, frames=None, timestamps=None) -> AngleChunk:
+    if frames is None:
+        frames = np.arange(start, start + len(angles), dtype=np.int64)
+    return AngleChunk(
+        np.asarray(frames, dtype=np.int64),
+        None if timestamps is None else np.asarray(timestamps, dtype=np.float64),
+        angles,
+    )
+
+
+def _to_angles(array: np.ndarray, engine: AngleEngine) -> np.ndarray:
+    """Angles from a landmarks block, or the block itself if it already holds angles"""
+    if array.ndim == 3:
+        return engine.compute(array)
+    if array.ndim == 2 and array.shape[1] == len(JOINTS):
+        return np.asarray(array, dtype=np.float64)
+    raise ValueError(f"Expected landmarks (frames, {NUM_LANDMARKS}, k) or angles (frames, {len(JOINTS)}), got {array.shape}")
+
+
+# --------------------------------------------------
+# CSV
+# --------------------------------------------------
+
+def _csv_layout(columns: List[str]):
+    """Column order for landmark x/y (frames x 33 x 2) or joint angles, whichever the header has"""
+    positions = {}
+    for column in columns:
+        match = _LANDMARK_COLUMN.match(column.strip())
+        if match:
+            axis = (match.group(1) or match.group(4)).lower()
+            landmark = int(match.group(2) or match.group(3))
+            positions[(landmark, axis)] = column
+    wanted = [(landmark, axis) for landmark in range(NUM_LANDMARKS) for axis in ("x", "y")]
+    if all(key in positions for key in wanted):
+        return "landmarks", [positions[key] for key in wanted]
+
+    angle_columns = []
+    for joint in JOINTS:
+        found = [c for c in (joint, joint_column(joint)) if c in columns]
+        angle_columns.append(found[0] if found else None)
+    if any(angle_columns):
+        return "angles", angle_columns
+    raise ValueError("CSV has neither landmark columns (x0..x32, y0..y32) nor joint angle columns")
+
+
+def read_csv(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, engine: Optional[AngleEngine] = None) -> Iterator[AngleChunk]:
+    import pandas as pd
+
+    engine = engine or AngleEngine()
+    columns = list(pd.read_csv(path, nrows=0).columns)
+    kind, layout = _csv_layout(columns)
+    extra = [c for c in ("frame", "timestamp") if c in columns]
+
+    start = 0
+    usecols = [c for c in layout if c is not None] + extra
+    for frame in pd.read_csv(path, usecols=usecols, chunksize=chunk_size):
+        if kind == "landmarks":
+            values = frame[layout].to_numpy(dtype=np.float64).reshape(len(frame), NUM_LANDMARKS, 2)
+            angles = engine.compute(values)
+        else:
+            angles = np.full((len(frame), len(JOINTS)), np.nan)
+            for j, column in enumerate(layout):
+                if column is not None:
+                    angles[:, j] = frame[column].to_numpy(dtype=np.float64)
+        yield _chunk(
+            start, angles,
+            frame["frame"].to_numpy() if "frame" in extra else None,
+            frame["timestamp"].to_numpy() if "timestamp" in extra else None,
+        )
+        start += len(frame)
+
+
+# --------------------------------------------------
+# NPY / NPZ
+# --------------------------------------------------
+
+def _npy_blocks(f: IO[bytes], chunk_size: int) -> Iterator[np.ndarray]:
+    """Consecutive blocks of rows from an .npy stream, reading only `chunk_size` rows at a time"""
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+    elif version == (2, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+    else:
+        raise ValueError(f"Unsupported .npy format version {version}")
+    if fortran_order or dtype.hasobject:
+        raise ValueError("Only C-ordered numeric arrays can be streamed")
+
+    row_shape = shape[1:]
+    row_bytes = int(np.prod(row_shape, dtype=np.int64)) * dtype.itemsize
+    remaining = shape[0]
+    while remaining:
+        rows = min(chunk_size, remaining)
+        data = f.read(rows * row_bytes)
+        if len(data) != rows * row_bytes:
+            raise ValueError("Truncated .npy data")
+        yield np.frombuffer(data, dtype=dtype).reshape((rows,) + row_shape)
+        remaining -= rows
+
+
+def read_npz(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, engine: Optional[AngleEngine] = None) -> Iterator[AngleChunk]:
+    engine = engine or AngleEngine()
+    with zipfile.ZipFile(path) as archive, contextlib.ExitStack() as members_open:
+        members = set(archive.namelist())
+        data_member = next((m for m in ("landmarks.npy", "angles.npy") if m in members), None)
+        if data_member is None:
+            raise ValueError(f"{path} has no 'landmarks' or 'angles' array")
+
+        data = members_open.enter_context(archive.open(data_member))
+        timestamps = None
+        if "timestamps.npy" in members:
+            timestamps = _npy_blocks(members_open.enter_context(archive.open("timestamps.npy")), chunk_size)
+
+        start = 0
+        for block in _npy_blocks(data, chunk_size):
+            angles = _to_angles(block, engine)
+            yield _chunk(start, angles, timestamps=None if timestamps is None else next(timestamps))
+            start += len(block)
+
+
+def read_npy(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, engine: Optional[AngleEngine] = None) -> Iterator[AngleChunk]:
+    engine = engine or AngleEngine()
+    array = np.load(path, mmap_mode="r")
+    for start in range(0, len(array), chunk_size):
+        yield _chunk(start, _to_angles(array[start:start + chunk_size], engine))
+
+
+# --------------------------------------------------
+# JSONL
+# --------------------------------------------------
+
+def read_jsonl(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, engine: Optional[AngleEngine] = None) -> Iterator[AngleChunk]:
+    engine = engine or AngleEngine()
+    landmarks = np.empty((chunk_size, NUM_LANDMARKS, 2), dtype=np.float64)
+    angles = np.empty((chunk_size, len(JOINTS)), dtype=np.float64)
+    frames = np.empty(chunk_size, dtype=np.int64)
+    timestamps = np.full(chunk_size, np.nan)
+    is_angles = np.zeros(chunk_size, dtype=bool)
+
+    def flush(n):
+        out = engine.compute(landmarks[:n])
+        out[is_angles[:n]] = angles[:n][is_angles[:n]]
+        has_times = not np.isnan(timestamps[:n]).all()
+        return _chunk(0, out, frames[:n].copy(), timestamps[:n].copy() if has_times else None)
+
+    n, index = 0, 0
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            frames[n] = record.get("frame", index)
+            timestamps[n] = record.get("timestamp", np.nan)
+            is_angles[n] = "angles" in record
+            if is_angles[n]:
+                angles[n] = [record["angles"].get(joint, np.nan) for joint in JOINTS]
+                landmarks[n] = np.nan
+            elif record.get("landmarks") is None:
+                landmarks[n] = np.nan
+            else:
+                landmarks[n] = [point[:2] for point in record["landmarks"]]
+            n += 1
+            index += 1
+            if n == chunk_size:
+                yield flush(n)
+                n = 0
+    if n:
+        yield flush(n)
+
+
+# --------------------------------------------------
+# Dispatch
+# --------------------------------------------------
+
+READERS = {"csv": read_csv, "npz": read_npz, "npy": read_npy, "jsonl": read_jsonl}
+
+
+def session_format(path: str) -> str:
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix not in SESSION_FORMATS:
+        raise ValueError(f"Unknown session format {suffix!r} (expected one of {', '.join(SESSION_FORMATS)})")
+    return SESSION_FORMATS[suffix]
+
+
+def read_session(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, engine: Optional[AngleEngine] = None) -> Iterator[AngleChunk]:
+    """Joint angles of a recorded session, chunk by chunk, whatever its format"""
+    return READERS[session_format(path)](path, chunk_size, engine)
@@ -0,0 +1,324 @@
+"""
+Temporal smoothing and hold detection for streaming pose feedback
+
+A constant-memory stage between per-frame joint angles and feedback:
+
+    angles -> smoother (EMA or One-Euro, per joint) -> ring buffer of recent angles
+           -> joint pass/fail with a hysteresis margin -> pose score -> hold state machine
+
+It returns events instead of a verdict per frame, so feedback is rendered
+and scored when something changes rather than on every frame:
+
+    joint      a joint went in or out of its band (by more than the margin)
+    entered    the pose score stayed at enter_score or above for enter_s
+    holding    every report_every_s while held, with the held time and steadiness
+    broke      the score stayed below exit_score for exit_s; reports the hold length
+
+    python -m pose_analysis events session.npz --pose Dandasana
+"""
+
+import argparse
+import json
+import math
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from .reference import DEFAULT_POSES_PATH, PoseReference, load_reference
+from .sessions import DEFAULT_CHUNK_SIZE, AngleChunk, read_session
+
+DEFAULT_RATE = 30.0
+
+
+# --------------------------------------------------
+# Smoothers (one state per joint; NaN joints keep their state and stay NaN)
+# --------------------------------------------------
+
+class EMASmoother:
+    """smoothed + alpha * (raw - smoothed), as PoseCalibrationFragment smooths angles (alpha 0.7 there)"""
+
+    def __init__(self, alpha: float = 0.7):
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        self._state: Optional[np.ndarray] = None
+
+    def __call__(self, x: np.ndarray, t: Optional[float] = None) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float64)
+        if self._state is None:
+            self._state = x.copy()
+        else:
+            seen = ~np.isnan(x)
+            fresh = seen & np.isnan(self._state)
+            self._state[fresh] = x[fresh]
+            update = seen & ~fresh
+            self._state[update] += self.alpha * (x[update] - self._state[update])
+        return np.where(np.isnan(x), np.nan, self._state)
+
+
+class OneEuroFilter:
+    """
+    One-Euro filter (Casiez et al., 2012): a low-pass whose cutoff rises with speed,
+    so a held pose is steady while movements are followed with little lag
+    Cutoffs are in Hz and beta in 1 / degree; frames without timestamps are 1 / rate apart
+    """
+
+    def __init__(self, min_cutoff: float = 1.0, beta: float = 0.05, d_cutoff: float = 1.0, rate: float = DEFAULT_RATE):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.rate = rate
+        self.reset()
+
+    def reset(self):
+        self._x: Optional[np.ndarray] = None
+        self._dx: Optional[np.ndarray] = None
+        self._t: Optional[float] = None
+
+    @staticmethod
+    def _alpha(cutoff, dt: float):
+        return 1.0 / (1.0 + 1.0 / (2.0 * math.pi * cutoff * dt))
+
+    def __call__(self, x: np.ndarray, t: Optional[float] = None) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float64)
+        if t is None:
+            t = 0.0 if self._t is None else self._t + 1.0 / self.rate
+        if self._x is None:
+            self._x, self._dx, self._t = x.copy(), np.zeros_like(x), t
+            return x.copy()
+
+        dt = t - self._t if t > self._t else 1.0 / self.rate
+        self._t = t
+        seen = ~np.isnan(x)
+        fresh = seen & np.isnan(self._x)
+        self._x[fresh], self._dx[fresh] = x[fresh], 0.0
+        update = seen & ~fresh
+
+        dx = (x[update] - self._x[update]) / dt
+        self._dx[update] += self._alpha(self.d_cutoff, dt) * (dx - self._dx[update])
+        cutoff = self.min_cutoff + self.beta * np.abs(self._dx[update])
+        self._x[update] += self._alpha(cutoff, dt) * (x[update] - self._x[update])
+        return np.where(seen, self._x, np.nan)
+
+
+class NoSmoothing:
+    def reset(self):
+        pass
+
+    def __call__(self, x: np.ndarray, t: Optional[float] = None) -> np.ndarray:
+        return np.asarray(x, dtype=np.float64)
+
+
+SMOOTHERS = {"one-euro": OneEuroFilter, "ema": EMASmoother, "none": NoSmoothing}
+
+
+# --------------------------------------------------
+# Ring buffer
+# --------------------------------------------------
+
+class RingBuffer:
+    """The last `capacity` rows of angles and their times, in preallocated arrays"""
+
+    def __init__(self, capacity: int, width: int):
+        self.capacity = capacity
+        self._values = np.full((capacity, width), np.nan)
+        self._times = np.full(capacity, np.nan)
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, values: np.ndarray, t: float):
+        self._values[self._next] = values
+        self._times[self._next] = t
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def _ordered(self, array: np.ndarray) -> np.ndarray:
+        if self._size < self.capacity:
+            return array[:self._size]
+        return np.concatenate([array[self._next:], array[:self._next]])
+
+    def values(self) -> np.ndarray:
+        """Buffered rows, oldest first"""
+        return self._ordered(self._values)
+
+    def times(self) -> np.ndarray:
+        return self._ordered(self._times)
+
+    def steadiness(self) -> float:
+        """Mean per-joint standard deviation over the buffer, in degrees; NaN while empty"""
+        if not self._size:
+            return float("nan")
+        values = self._values[:self._size]
+        visible = ~np.isnan(values).all(axis=0)
+        return float(np.nanstd(values[:, visible], axis=0).mean()) if visible.any() else float("nan")
+
+    def clear(self):
+        self._values[:] = np.nan
+        self._times[:] = np.nan
+        self._next = self._size = 0
+
+
+# --------------------------------------------------
+# Hold state machine
+# --------------------------------------------------
+
+class HoldDetector:
+    """
+    Hysteresis over a per-frame pose score in [0, 1]
+    Entering needs score >= enter_score for enter_s without a break; once held, the
+    pose only breaks after exit_s below exit_score, so brief dips are ignored
+    """
+
+    OUT, ENTERING, HOLDING, LEAVING = "out", "entering", "holding", "leaving"
+
+    def __init__(
+        self,
+        enter_score: float = 1.0,
+        exit_score: float = 0.75,
+        enter_s: float = 0.5,
+        exit_s: float = 0.5,
+        report_every_s: float = 1.0,
+    ):
+        if exit_score > enter_score:
+            raise ValueError("exit_score must not exceed enter_score")
+        self.enter_score = enter_score
+        self.exit_score = exit_score
+        self.enter_s = enter_s
+        self.exit_s = exit_s
+        self.report_every_s = report_every_s
+        self.reset()
+
+    def reset(self):
+        self.state = self.OUT
+        self._since = 0.0
+        self._hold_start = 0.0
+        self._next_report = 0.0
+
+    def update(self, score: float, t: float) -> List[Dict]:
+        if self.state == self.OUT:
+            if score >= self.enter_score:
+                self.state, self._since = self.ENTERING, t
+
+        if self.state == self.ENTERING:
+            if score < self.enter_score:
+                self.state = self.OUT
+            elif t - self._since >= self.enter_s:
+                self.state, self._hold_start = self.HOLDING, self._since
+                self._next_report = self._hold_start + self.report_every_s
+                return [{"event": "entered", "t": t, "since": self._hold_start}]
+            return []
+
+        if self.state == self.HOLDING:
+            if score < self.exit_score:
+                self.state, self._since = self.LEAVING, t
+            elif t >= self._next_report:
+                while self._next_report <= t:
+                    self._next_report += self.report_every_s
+                return [{"event": "holding", "t": t, "held_s": round(t - self._hold_start, 3)}]
+            return []
+
+        if self.state == self.LEAVING:
+            if score >= self.exit_score:
+                self.state = self.HOLDING
+            elif t - self._since >= self.exit_s:
+                self.state = self.OUT
+                return [{"event": "broke", "t": t, "held_s": round(self._since - self._hold_start, 3)}]
+        return []
+
+
+# --------------------------------------------------
+# Feedback stage
+# --------------------------------------------------
+
+class FeedbackStage:
+    """
+    Smoothing, per-joint hysteresis and hold detection for one pose
+    A joint that passes only fails once it leaves the band by more than `joint_margin`
+    degrees, and only passes again once it is that far inside (band edges clamped at
+    0 or 180 degrees are not narrowed, since angles cannot go past them)
+    """
+
+    def __init__(
+        self,
+        reference: PoseReference,
+        smoother=None,
+        detector: Optional[HoldDetector] = None,
+        window: int = 30,
+        joint_margin: float = 2.0,
+    ):
+        if len(reference) != 1:
+            raise ValueError("FeedbackStage follows a single pose; pass reference.select([name])")
+        self.pose = reference.names[0]
+        self.joints = reference.joints
+        self.smoother = smoother if smoother is not None else OneEuroFilter()
+        self.detector = detector if detector is not None else HoldDetector()
+        self.buffer = RingBuffer(window, len(self.joints))
+
+        low, high = reference.min_angles[0], reference.max_angles[0]
+        self._outer = (low - joint_margin, high + joint_margin)
+        self._inner = (np.where(low <= 0.0, low, low + joint_margin), np.where(high >= 180.0, high, high - joint_margin))
+        self.passed = np.zeros(len(self.joints), dtype=bool)
+
+    def update(self, angles: np.ndarray, t: float) -> List[Dict]:
+        """Feed one frame of joint angles at time t (seconds); returns the events it caused"""
+        smoothed = self.smoother(angles, t)
+        self.buffer.push(smoothed, t)
+
+        with np.errstate(invalid="ignore"):
+            in_outer = (smoothed >= self._outer[0]) & (smoothed <= self._outer[1])
+            in_inner = (smoothed >= self._inner[0]) & (smoothed <= self._inner[1])
+        passed = np.where(self.passed, in_outer, in_inner)
+
+        events = [
+            {"event": "joint", "t": t, "joint": self.joints[j], "passed": bool(passed[j]),
+             "angle": None if np.isnan(smoothed[j]) else round(float(smoothed[j]), 1)}
+            for j in np.flatnonzero(passed != self.passed)
+        ]
+        self.passed = passed
+
+        visible = ~np.isnan(smoothed)
+        score = float(passed[visible].mean()) if visible.any() else 0.0
+        for event in self.detector.update(score, t):
+            if event["event"] == "holding":
+                event["steadiness_deg"] = round(self.buffer.steadiness(), 2)
+            events.append(event)
+        return events
+
+    def run(self, chunks: Iterable[AngleChunk], rate: float = DEFAULT_RATE) -> Iterator[Dict]:
+        """Events for a recorded session; frames without timestamps are 1 / rate apart"""
+        for chunk in chunks:
+            times = chunk.timestamps if chunk.timestamps is not None else chunk.frames / rate
+            for frame, t, angles in zip(chunk.frames, times, chunk.angles):
+                for event in self.update(angles, float(t)):
+                    yield {"frame": int(frame), "pose": self.pose, **event}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m pose_analysis events", description="Smoothed hold and joint events for recorded sessions"
+    )
+    parser.add_argument("sessions", nargs="+", help="CSV, NPZ, NPY or JSONL session files")
+    parser.add_argument("--pose", required=True)
+    parser.add_argument("--poses-json", default=DEFAULT_POSES_PATH)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--filter", choices=list(SMOOTHERS), default="one-euro")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="frames per second when a session has no timestamps")
+    parser.add_argument("--enter-s", type=float, default=0.5)
+    parser.add_argument("--exit-s", type=float, default=0.5)
+    parser.add_argument("--report-every-s", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    reference = load_reference(args.poses_json, [args.pose])
+    for path in args.sessions:
+        stage = FeedbackStage(
+            reference,
+            smoother=SMOOTHERS[args.filter](),
+            detector=HoldDetector(enter_s=args.enter_s, exit_s=args.exit_s, report_every_s=args.report_every_s),
+        )
+        for event in stage.run(read_session(path, args.chunk_size), rate=args.rate):
+            sys.stdout.write(json.dumps({"session": path, **event}) + "\n")
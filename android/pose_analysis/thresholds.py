@@ -0,0 +1,379 @@
+"""
+Data-driven calibration of reference angles and tolerance bands
+
+Builds yoga_poses.json and pose_thresholds.csv from recorded sessions of
+each pose instead of hand-set deviations. Every angle a session contributes
+goes into a fixed-width histogram over [0, 180] degrees per pose and joint
+(0.1 degree bins by default, 8 x 1801 counts per pose), so memory does not
+grow with the number of sessions or frames. Histograms of separate sessions
+simply add up, which lets `--jobs` workers read sessions in parallel. The
+robust statistics come from the merged histograms, exact to the bin width:
+
+    mad         reference = median, deviation = mad_scale * 1.4826 * MAD
+    percentile  band = [low, high] percentiles, reference = its midpoint
+
+Deviations are clamped to [min_deviation, max_deviation]. A joint with fewer
+than `min_frames` visible frames keeps the reference and deviation of the
+base file, as do poses without sessions, so a regenerated file stays complete.
+
+Sessions are labelled by a manifest (CSV with session and pose columns,
+paths relative to the manifest) or by directory, one subdirectory per pose:
+
+    python -m pose_analysis calibrate sessions/ --out-json yoga_poses.json --out-csv pose_thresholds.csv
+    python -m pose_analysis calibrate --manifest sessions.csv --method percentile --jobs 8 --out-json out.json
+
+Both outputs carry the same version number (the base file's plus one unless
+given). yoga_poses.json keeps the layout YogaPoseLoader parses and adds
+"version" and "calibration" keys (top level and per calibrated pose), which
+it ignores. pose_thresholds.csv has the pose, joint (left_knee_angle ...),
+min_angle and max_angle columns that run_calibration() reads, plus
+reference_angle, deviation, frames and version. Poses are named as in
+yoga_poses.json, the names calibration.ipynb looks them up by.
+"""
+
+import argparse
+import csv
+import datetime
+import json
+import os
+import sys
+from multiprocessing import Pool
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .angles import JOINTS, joint_column
+from .reference import DEFAULT_POSES_PATH, PoseReference
+from .sessions import DEFAULT_CHUNK_SIZE, SESSION_FORMATS, AngleChunk, read_session
+
+# 1.4826 * MAD estimates the standard deviation of normally distributed angles
+MAD_TO_SIGMA = 1.4826
+
+CSV_COLUMNS = ["pose", "joint", "min_angle", "max_angle", "reference_angle", "deviation", "frames", "version"]
+
+
+# --------------------------------------------------
+# Online statistics
+# --------------------------------------------------
+
+class AngleHistogram:
+    """Counts of joint angles in fixed-width bins over [0, 180] degrees, one row per joint"""
+
+    def __init__(self, joints=JOINTS, bin_width: float = 0.1):
+        self.joints = tuple(joints)
+        self.bin_width = bin_width
+        self.bins = int(round(180.0 / bin_width)) + 1
+        self.centers = np.arange(self.bins) * bin_width
+        self.counts = np.zeros((len(self.joints), self.bins), dtype=np.int64)
+
+    def add(self, angles: np.ndarray):
+        """Count (frames, joints) angles; NaN (not visible) angles are skipped"""
+        angles = np.asarray(angles, dtype=np.float64)
+        visible = ~np.isnan(angles)
+        bins = np.clip(np.rint(angles[visible] / self.bin_width), 0, self.bins - 1).astype(np.int64)
+        joints = np.broadcast_to(np.arange(len(self.joints)), angles.shape)[visible]
+        self.counts += np.bincount(joints * self.bins + bins, minlength=self.counts.size).reshape(self.counts.shape)
+
+    def add_chunks(self, chunks: Iterable[AngleChunk]):
+        for chunk in chunks:
+            self.add(chunk.angles)
+
+    def merge(self, other: "AngleHistogram"):
+        if other.counts.shape != self.counts.shape:
+            raise ValueError("Histograms have different joints or bin widths")
+        self.counts += other.counts
+
+    def frames(self) -> np.ndarray:
+        """Visible frames per joint"""
+        return self.counts.sum(axis=1)
+
+    @staticmethod
+    def _quantile(counts: np.ndarray, values: np.ndarray, q: float) -> np.ndarray:
+        # First bin whose cumulative count reaches q of the total, per row; NaN for empty rows
+        cumulative = np.cumsum(counts, axis=1)
+        totals = cumulative[:, -1]
+        index = np.argmax(cumulative >= np.maximum(q * totals, 1)[:, None], axis=1)
+        return np.where(totals > 0, np.take_along_axis(values, index[:, None], axis=1)[:, 0], np.nan)
+
+    def quantile(self, q: float) -> np.ndarray:
+        """q-quantile (0..1) per joint"""
+        return self._quantile(self.counts, np.broadcast_to(self.centers, self.counts.shape), q)
+
+    def median(self) -> np.ndarray:
+        return self.quantile(0.5)
+
+    def mad(self) -> np.ndarray:
+        """Median absolute deviation from the median per joint"""
+        distance = np.abs(self.centers[None, :] - np.nan_to_num(self.median())[:, None])
+        order = np.argsort(distance, axis=1, kind="stable")
+        return self._quantile(
+            np.take_along_axis(self.counts, order, axis=1), np.take_along_axis(distance, order, axis=1), 0.5
+        )
+
+
+# --------------------------------------------------
+# Session discovery
+# --------------------------------------------------
+
+def _session_files(directory: str) -> Iterator[str]:
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in SESSION_FORMATS:
+                yield os.path.join(root, name)
+
+
+def sessions_from_directory(root: str) -> Iterator[Tuple[str, str]]:
+    """(session path, pose label) for every session under root/<pose>/"""
+    for entry in sorted(os.scandir(root), key=lambda e: e.name):
+        if entry.is_dir():
+            for path in _session_files(entry.path):
+                yield path, entry.name
+
+
+def sessions_from_manifest(path: str) -> Iterator[Tuple[str, str]]:
+    """(session path, pose label) from a CSV with session and pose columns; paths are relative to the manifest"""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        if not {"session", "pose"} <= set(reader.fieldnames or []):
+            raise ValueError(f"{path} needs 'session' and 'pose' columns")
+        for row in reader:
+            yield os.path.join(base, row["session"]), row["pose"]
+
+
+# --------------------------------------------------
+# Calibration
+# --------------------------------------------------
+
+def _session_counts(task) -> Tuple[str, np.ndarray]:
+    path, label, bin_width, chunk_size = task
+    histogram = AngleHistogram(bin_width=bin_width)
+    histogram.add_chunks(read_session(path, chunk_size))
+    return label, histogram.counts
+
+
+class Calibration:
+    """Per-pose angle histograms accumulated session by session"""
+
+    def __init__(self, bin_width: float = 0.1):
+        self.bin_width = bin_width
+        self.histograms: Dict[str, AngleHistogram] = {}
+        self.sessions: Dict[str, int] = {}
+
+    def _histogram(self, pose: str) -> AngleHistogram:
+        if pose not in self.histograms:
+            self.histograms[pose] = AngleHistogram(bin_width=self.bin_width)
+            self.sessions[pose] = 0
+        return self.histograms[pose]
+
+    def add_counts(self, pose: str, counts: np.ndarray):
+        self._histogram(pose).counts += counts
+        self.sessions[pose] += 1
+
+    def add_session(self, pose: str, chunks: Iterable[AngleChunk]):
+        histogram = AngleHistogram(bin_width=self.bin_width)
+        histogram.add_chunks(chunks)
+        self.add_counts(pose, histogram.counts)
+
+    def add_sessions(self, sessions: Iterable[Tuple[str, str]], chunk_size: int = DEFAULT_CHUNK_SIZE, jobs: int = 1):
+        """Read (path, pose) sessions, in `jobs` worker processes when above 1"""
+        tasks = ((path, pose, self.bin_width, chunk_size) for path, pose in sessions)
+        if jobs <= 1:
+            for label, counts in map(_session_counts, tasks):
+                self.add_counts(label, counts)
+            return
+        with Pool(jobs) as pool:
+            for label, counts in pool.imap_unordered(_session_counts, tasks, chunksize=16):
+                self.add_counts(label, counts)
+
+    def build(
+        self,
+        base: Optional[PoseReference] = None,
+        method: str = "mad",
+        mad_scale: float = 2.5,
+        percentiles: Tuple[float, float] = (2.5, 97.5),
+        min_deviation: float = 5.0,
+        max_deviation: float = 45.0,
+        min_frames: int = 300,
+    ) -> Tuple[PoseReference, Dict[str, Dict]]:
+        """
+        Reference angles and deviations for the base poses (in base order) followed by new poses
+        Also returns per pose the sessions and the visible frames per joint behind it (zero
+        frames where the base values were kept)
+        """
+        names = list(base.names) if base is not None else []
+        labels = {}
+        for label in self.histograms:
+            try:
+                pose = base.names[base.index(label)] if base is not None else label
+            except KeyError:
+                pose = label
+            if pose not in names:
+                names.append(pose)
+            labels.setdefault(pose, []).append(label)
+
+        angles = np.full((len(names), len(JOINTS)), np.nan)
+        deviations = np.full((len(names), len(JOINTS)), np.nan)
+        stats = {}
+        for p, pose in enumerate(names):
+            if base is not None and pose in base.names:
+                angles[p] = base.angles[base.names.index(pose)]
+                deviations[p] = base.deviations[base.names.index(pose)]
+            stats[pose] = {"sessions": 0, "frames": np.zeros(len(JOINTS), dtype=np.int64)}
+            if pose not in labels:
+                continue
+
+            histogram = AngleHistogram(bin_width=self.bin_width)
+            for label in labels[pose]:
+                histogram.merge(self.histograms[label])
+                stats[pose]["sessions"] += self.sessions[label]
+            if method == "mad":
+                reference = histogram.median()
+                deviation = mad_scale * MAD_TO_SIGMA * histogram.mad()
+            elif method == "percentile":
+                low, high = histogram.quantile(percentiles[0] / 100), histogram.quantile(percentiles[1] / 100)
+                reference, deviation = (low + high) / 2, (high - low) / 2
+            else:
+                raise ValueError(f"Unknown calibration method {method!r}")
+
+            calibrated = histogram.frames() >= min_frames
+            angles[p, calibrated] = reference[calibrated]
+            deviations[p, calibrated] = np.clip(deviation[calibrated], min_deviation, max_deviation)
+            stats[pose]["frames"][calibrated] = histogram.frames()[calibrated]
+
+        missing = np.isnan(angles).any(axis=1)
+        if missing.any():
+            raise ValueError(
+                f"Too few frames (< {min_frames}) to calibrate every joint of new poses: "
+                + ", ".join(n for n, m in zip(names, missing) if m)
+            )
+        return PoseReference(names, angles, deviations), stats
+
+
+# --------------------------------------------------
+# Output
+# --------------------------------------------------
+
+def _replace(path: str, write):
+    # Write next to the target and rename, so readers never see a half-written file
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", newline="") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def read_version(path: str) -> int:
+    """Version of a yoga_poses.json; 0 for files written before calibration was versioned"""
+    with open(path) as f:
+        return int(json.load(f).get("version", 0))
+
+
+def write_poses_json(path: str, reference: PoseReference, version: int, metadata: Dict, stats: Dict[str, Dict]):
+    poses = []
+    for p, name in enumerate(reference.names):
+        pose = {
+            "pose_name": name,
+            "reference_angles": {j: round(float(a), 2) for j, a in zip(reference.joints, reference.angles[p])},
+            "deviations": {j: round(float(d), 2) for j, d in zip(reference.joints, reference.deviations[p])},
+        }
+        if stats[name]["frames"].any():
+            pose["calibration"] = {
+                "sessions": stats[name]["sessions"],
+                "frames": {j: int(n) for j, n in zip(reference.joints, stats[name]["frames"])},
+            }
+        poses.append(pose)
+    document = {"version": version, "calibration": metadata, "poses": poses}
+    _replace(path, lambda f: f.write(json.dumps(document, indent=2) + "\n"))
+
+
+def write_thresholds_csv(path: str, reference: PoseReference, version: int, stats: Dict[str, Dict]):
+    # Bands are rounded as in the JSON, so both files give the app and the notebook the same thresholds
+    def write(f):
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for p, name in enumerate(reference.names):
+            for j, joint in enumerate(reference.joints):
+                angle, deviation = round(float(reference.angles[p, j]), 2), round(float(reference.deviations[p, j]), 2)
+                writer.writerow([
+                    name,
+                    joint_column(joint),
+                    round(min(max(angle - deviation, 0.0), 180.0), 2),
+                    round(min(max(angle + deviation, 0.0), 180.0), 2),
+                    angle,
+                    deviation,
+                    int(stats[name]["frames"][j]),
+                    version,
+                ])
+    _replace(path, write)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m pose_analysis calibrate",
+        description="Derive reference angles and tolerance bands from recorded sessions of each pose",
+    )
+    parser.add_argument("directories", nargs="*", help="directories with one subdirectory of sessions per pose")
+    parser.add_argument("--manifest", action="append", default=[], help="CSV of session,pose rows (repeatable)")
+    parser.add_argument("--base", default=DEFAULT_POSES_PATH, help="yoga_poses.json to start from; '' for none")
+    parser.add_argument("--out-json", help="write yoga_poses.json here")
+    parser.add_argument("--out-csv", help="write pose_thresholds.csv here")
+    parser.add_argument("--version", type=int, help="version of the outputs; the base file's plus one by default")
+    parser.add_argument("--method", choices=["mad", "percentile"], default="mad")
+    parser.add_argument("--mad-scale", type=float, default=2.5, help="deviation in robust standard deviations")
+    parser.add_argument("--percentiles", type=float, nargs=2, default=[2.5, 97.5], metavar=("LOW", "HIGH"))
+    parser.add_argument("--min-deviation", type=float, default=5.0)
+    parser.add_argument("--max-deviation", type=float, default=45.0)
+    parser.add_argument("--min-frames", type=int, default=300, help="visible frames a joint needs to be calibrated")
+    parser.add_argument("--bin-width", type=float, default=0.1, help="histogram resolution in degrees")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--jobs", type=int, default=1, help="worker processes reading sessions")
+    args = parser.parse_args(argv)
+    if not args.directories and not args.manifest:
+        parser.error("give session directories or --manifest")
+    if not args.out_json and not args.out_csv:
+        parser.error("give --out-json and/or --out-csv")
+
+    def sessions():
+        for directory in args.directories:
+            yield from sessions_from_directory(directory)
+        for manifest in args.manifest:
+            yield from sessions_from_manifest(manifest)
+
+    base = PoseReference.from_json(args.base) if args.base else None
+    version = args.version if args.version is not None else (read_version(args.base) if args.base else 0) + 1
+
+    calibration = Calibration(bin_width=args.bin_width)
+    calibration.add_sessions(sessions(), chunk_size=args.chunk_size, jobs=args.jobs)
+    reference, stats = calibration.build(
+        base,
+        method=args.method,
+        mad_scale=args.mad_scale,
+        percentiles=tuple(args.percentiles),
+        min_deviation=args.min_deviation,
+        max_deviation=args.max_deviation,
+        min_frames=args.min_frames,
+    )
+
+    metadata = {
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "method": args.method,
+        **({"mad_scale": args.mad_scale} if args.method == "mad" else {"percentiles": args.percentiles}),
+        "min_deviation": args.min_deviation,
+        "max_deviation": args.max_deviation,
+        "min_frames": args.min_frames,
+        "bin_width": args.bin_width,
+        "sessions": sum(calibration.sessions.values()),
+    }
+    if args.out_json:
+        write_poses_json(args.out_json, reference, version, metadata, stats)
+    if args.out_csv:
+        write_thresholds_csv(args.out_csv, reference, version, stats)
+
+    for name in reference.names:
+        sys.stdout.write(json.dumps({
+            "pose": name,
+            "sessions": stats[name]["sessions"],
+            "calibrated_joints": int((stats[name]["frames"] > 0).sum()),
+            "version": version,
+        }) + "\n")
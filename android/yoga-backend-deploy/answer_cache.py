@@ -0,0 +1,154 @@
+"""
+Semantic answer cache for /chat/
+
+Chat questions are often near-duplicates ("what helps back pain" and "poses for
+lower back pain"). Each answered question is stored as (query embedding,
+retrieved pose ids, answer) in a small preallocated vector index; a new
+question reuses an answer when its embedding is close enough to a stored one
+and it retrieved (nearly) the same poses, so the answer was grounded on the
+same context. Every hit is one LLM call saved.
+
+Configured from the environment:
+    CHAT_CACHE_MAX_ENTRIES   capacity, least recently used evicted first (default 1024, 0 disables)
+    CHAT_CACHE_THRESHOLD     minimum cosine similarity between queries (default 0.92)
+    CHAT_CACHE_MIN_OVERLAP   minimum Jaccard overlap of the retrieved pose ids (default 1.0: same poses)
+    CHAT_CACHE_TTL_S         default 3600, 0 disables expiry
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+def _overlap(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        dim: int,
+        max_entries: int = 1024,
+        threshold: float = 0.92,
+        min_overlap: float = 1.0,
+        ttl_seconds: float = 3600.0,
+    ):
+        self.dim = dim
+        self.max_entries = max(0, max_entries)
+        self.threshold = threshold
+        self.min_overlap = min_overlap
+        self.ttl = ttl_seconds
+
+        # Slot i holds one entry; unused and expired slots score -inf
+        self._embs = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self._stored_at = np.zeros(self.max_entries, dtype=np.float64)
+        self._last_used = np.full(self.max_entries, -np.inf)
+        self._used = np.zeros(self.max_entries, dtype=bool)
+        self._poses: List[frozenset] = [frozenset()] * self.max_entries
+        self._answers: List[Optional[str]] = [None] * self.max_entries
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls, dim: int) -> "SemanticAnswerCache":
+        return cls(
+            dim,
+            max_entries=int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "1024")),
+            threshold=float(os.getenv("CHAT_CACHE_THRESHOLD", "0.92")),
+            min_overlap=float(os.getenv("CHAT_CACHE_MIN_OVERLAP", "1.0")),
+            ttl_seconds=float(os.getenv("CHAT_CACHE_TTL_S", "3600")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _expire(self, now: float):
+        if not self.ttl:
+            return
+        expired = self._used & (now - self._stored_at > self.ttl)
+        if expired.any():
+            for i in np.flatnonzero(expired):
+                self._answers[i] = None
+                self._poses[i] = frozenset()
+            self._used[expired] = False
+            self._last_used[expired] = -np.inf
+            self.expirations += int(expired.sum())
+
+    def get(self, query_emb: np.ndarray, poses: Iterable[int]) -> Optional[str]:
+        """Cached answer for a similar query with matching retrieved poses, or None"""
+        if not self.enabled:
+            return None
+        poses = frozenset(poses)
+
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+
+            sims = self._embs @ np.asarray(query_emb, dtype=np.float32)
+            sims[~self._used] = -np.inf
+            candidates = np.flatnonzero(sims >= self.threshold)
+
+            # Most similar first; the first one retrieved from the same context wins
+            for i in candidates[np.argsort(-sims[candidates], kind="stable")]:
+                if _overlap(self._poses[i], poses) >= self.min_overlap:
+                    self._last_used[i] = now
+                    self.hits += 1
+                    return self._answers[i]
+
+            self.misses += 1
+            return None
+
+    def put(self, query_emb: np.ndarray, poses: Iterable[int], answer: str):
+        # An empty answer would be served to every similar question until it expires
+        if not self.enabled or not answer.strip():
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+
+            free = np.flatnonzero(~self._used)
+            if len(free):
+                slot = free[0]
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+
+            self._embs[slot] = query_emb
+            self._stored_at[slot] = now
+            self._last_used[slot] = now
+            self._used[slot] = True
+            self._poses[slot] = frozenset(poses)
+            self._answers[slot] = answer
+
+    def clear(self):
+        with self._lock:
+            self._used[:] = False
+            self._last_used[:] = -np.inf
+            self._poses = [frozenset()] * self.max_entries
+            self._answers = [None] * self.max_entries
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": int(self._used.sum()),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "min_overlap": self.min_overlap,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,133 @@
+"""
+Dynamic micro-batching of query encodes
+
+Concurrent requests each call MicroBatcher.encode(text). Texts are collected
+for up to max_wait_ms or until max_batch texts are waiting, then encoded with a
+single batched forward pass on the inference executor, and each caller gets its
+own row back.
+
+Configured from the environment:
+    BATCH_MAX_SIZE      max texts per encode (default 16)
+    BATCH_MAX_WAIT_MS   max time the first text in a batch waits (default 5)
+"""
+
+import asyncio
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from inference import InferenceExecutor, InferenceQueueFull
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        encode_batch: Callable[[List[str]], np.ndarray],
+        executor: InferenceExecutor,
+        max_batch: int = 16,
+        max_wait_ms: float = 5.0,
+    ):
+        self.encode_batch = encode_batch
+        self.executor = executor
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        # Waiting texts beyond this are shed, same as a full executor queue
+        self.max_pending = self.max_batch * executor.max_queue
+
+        self._queue: List[Tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+        self._batches = 0
+        self._items = 0
+        self._encoded = 0
+        self._max_batch_seen = 0
+        self._batch_sizes: Dict[int, int] = {}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @classmethod
+    def from_env(cls, encode_batch: Callable[[List[str]], np.ndarray], executor: InferenceExecutor) -> "MicroBatcher":
+        return cls(
+            encode_batch,
+            executor,
+            max_batch=int(os.getenv("BATCH_MAX_SIZE", "16")),
+            max_wait_ms=float(os.getenv("BATCH_MAX_WAIT_MS", "5")),
+        )
+
+    async def encode(self, text: str) -> np.ndarray:
+        """Encode one text as part of the next batch"""
+        if len(self._queue) >= self.max_pending:
+            raise InferenceQueueFull(self.executor.retry_after)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((text, future, time.perf_counter()))
+
+        if len(self._queue) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._queue:
+            batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            task = asyncio.ensure_future(self._run(batch))
+            # Hold a reference so the task isn't garbage collected mid-flight
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        now = time.perf_counter()
+        waits = [now - enqueued for _, _, enqueued in batch]
+
+        # Identical texts in one batch are encoded once
+        unique = list(dict.fromkeys(text for text, _, _ in batch))
+        self._record(len(unique), waits)
+
+        try:
+            embeddings = await self.executor.run(self.encode_batch, unique)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        rows = {text: embeddings[i] for i, text in enumerate(unique)}
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(rows[text])
+
+    def _record(self, encoded: int, waits: List[float]):
+        size = len(waits)
+        self._batches += 1
+        self._items += size
+        self._encoded += encoded
+        self._max_batch_seen = max(self._max_batch_seen, size)
+        self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+        self._wait_total += sum(waits)
+        self._wait_max = max(self._wait_max, max(waits))
+
+    def stats(self) -> Dict:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self._batches,
+            "items": self._items,
+            "encoded": self._encoded,
+            "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+            "max_batch_size": self._max_batch_seen,
+            "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+            "avg_wait_ms": round(1000.0 * self._wait_total / self._items, 3) if self._items else 0.0,
+            "max_wait_ms_seen": round(1000.0 * self._wait_max, 3),
+            "queued": len(self._queue),
+        }
@@ -0,0 +1,351 @@
+"""
+Load test and latency benchmark for /recommend/, /chat/ and the on-device recommenders
+
+Drives the FastAPI app in-process (httpx over ASGITransport, no sockets) or a
+running server over HTTP, at each requested concurrency, with profiles and
+chat questions drawn from the onboarding option vocabulary:
+
+    python benchmark_backend.py                                   # in-process, both endpoints
+    python benchmark_backend.py --concurrency 1 8 32 --requests 500 --cache cold
+    python benchmark_backend.py --url http://localhost:8080       # start the server with LLM_BACKEND=fake
+    python benchmark_backend.py --endpoints --recommenders --out benchmarks.jsonl
+
+In-process runs always use the fake LLM (FAKE_LLM_DELAY_MS via --llm-delay-ms);
+--cache cold disables the response, query-embedding and chat answer caches so
+every request encodes and scores. They also time the encode and the scoring of
+each profile and chat question on their own, outside the request path.
+
+--recommenders compares OptimizedYogaRecommender (word overlap) with
+YogaRecommender (sentence-transformers) from the Android app on the same
+profiles: latency, load time, RSS growth and top-10 overlap.
+
+Prints one JSON object per result, tagged with the git commit; --out also
+appends them to a JSONL file so runs can be compared across commits.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Dict, List
+
+import numpy as np
+
+from benchmark_index import latency
+from memory import memory_breakdown, rss_bytes
+from precompute_responses import GOAL_OPTIONS, MENTAL_OPTIONS, PHYSICAL_OPTIONS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_PYTHON_DIR = os.path.join(HERE, "..", "app", "src", "main", "python")
+
+LEVELS = ["beginner", "intermediate", "advanced"]
+
+# How many problem areas users tick on the onboarding screen
+PHYSICAL_COUNT_WEIGHTS = [0.25, 0.35, 0.25, 0.15]
+
+CHAT_TEMPLATES = [
+    "What yoga poses help with {issue}?",
+    "Which poses are good for {goal}?",
+    "I have {issue}, what should I avoid?",
+    "Can you suggest a short routine for {goal}?",
+    "How can yoga help with {issue}?",
+]
+
+
+# --------------------------------------------------
+# Workload
+# --------------------------------------------------
+
+def sample_profiles(count: int, rng: random.Random) -> List[Dict]:
+    """Request bodies for /recommend/: mostly one goal, a few problem areas, sometimes stress"""
+    profiles = []
+    for _ in range(count):
+        physical_count = rng.choices(range(len(PHYSICAL_COUNT_WEIGHTS)), PHYSICAL_COUNT_WEIGHTS)[0]
+        profiles.append({
+            "age": rng.randint(18, 70),
+            "height": rng.randint(150, 195),
+            "weight": rng.randint(45, 110),
+            "goals": [rng.choice(GOAL_OPTIONS)] if rng.random() < 0.9 else [],
+            "physical_issues": rng.sample(PHYSICAL_OPTIONS, physical_count),
+            "mental_issues": list(MENTAL_OPTIONS) if rng.random() < 0.4 else [],
+            "level": rng.choice(LEVELS),
+        })
+    return profiles
+
+
+def sample_messages(count: int, rng: random.Random) -> List[Dict]:
+    """Request bodies for /chat/"""
+    return [
+        {"message": rng.choice(CHAT_TEMPLATES).format(
+            issue=rng.choice(PHYSICAL_OPTIONS + MENTAL_OPTIONS), goal=rng.choice(GOAL_OPTIONS)
+        )}
+        for _ in range(count)
+    ]
+
+
+# --------------------------------------------------
+# Load generation
+# --------------------------------------------------
+
+async def drive(client, path: str, bodies: List[Dict], concurrency: int) -> Dict:
+    """POST every body with `concurrency` requests in flight; latency percentiles and throughput"""
+    timings, statuses = [], Counter()
+    pending = iter(bodies)
+
+    async def user():
+        for body in pending:
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+                statuses[str(response.status_code)] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+                continue
+            timings.append((time.perf_counter() - started) * 1000.0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    wall_s = time.perf_counter() - started
+
+    return {
+        "requests": len(bodies),
+        "status": dict(statuses),
+        "throughput_rps": round(len(timings) / wall_s, 2),
+        **(latency(np.array(timings)) if timings else {}),
+    }
+
+
+async def run_endpoints(client, args, rng, server_stats) -> List[Dict]:
+    bodies = {
+        "/recommend/": lambda n: sample_profiles(n, rng),
+        "/chat/": lambda n: sample_messages(n, rng),
+    }
+    results = []
+    for endpoint in args.endpoints:
+        path = f"/{endpoint}/"
+        await drive(client, path, bodies[path](args.warmup), 1)
+        for concurrency in args.concurrency:
+            result = await drive(client, path, bodies[path](args.requests), concurrency)
+            results.append({
+                "benchmark": "endpoint",
+                "endpoint": path,
+                "concurrency": concurrency,
+                **result,
+                **await server_stats(),
+            })
+    return results
+
+
+# --------------------------------------------------
+# In-process and HTTP targets
+# --------------------------------------------------
+
+def configure_in_process(args):
+    """Environment for the imported backend; must run before recommendation_backend is imported"""
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_DELAY_MS"] = str(args.llm_delay_ms)
+    if args.cache == "cold":
+        os.environ["RESPONSE_CACHE_MAX_ENTRIES"] = "0"
+        os.environ["RESPONSE_CACHE_PATH"] = ""
+        os.environ["QUERY_CACHE_MAX_ENTRIES"] = "0"
+        os.environ["CHAT_CACHE_MAX_ENTRIES"] = "0"
+
+
+def stage_timings(backend, args, rng) -> List[Dict]:
+    """Encode and scoring time per profile / chat question, measured apart from the request path"""
+    from embedding_cache import normalize_query
+    from response_cache import canonical_profile
+
+    encode_ms, score_ms = [], []
+    for body in sample_profiles(args.stage_samples, rng):
+        profile = canonical_profile(body)
+        texts = [normalize_query(text) for text in backend.profile_queries(profile)]
+        started = time.perf_counter()
+        query_embs = list(backend.encode_batch(texts))
+        encoded = time.perf_counter()
+        backend.rank_profile(profile, query_embs)
+        encode_ms.append((encoded - started) * 1000.0)
+        score_ms.append((time.perf_counter() - encoded) * 1000.0)
+
+    chat_encode_ms, retrieve_ms = [], []
+    for body in sample_messages(args.stage_samples, rng):
+        started = time.perf_counter()
+        query_emb = backend.encode_batch([normalize_query(body["message"])])[0]
+        encoded = time.perf_counter()
+        backend.format_context(backend.retrieve_poses(query_emb))
+        chat_encode_ms.append((encoded - started) * 1000.0)
+        retrieve_ms.append((time.perf_counter() - encoded) * 1000.0)
+
+    return [
+        {"benchmark": "stages", "endpoint": "/recommend/", "samples": args.stage_samples,
+         "encode": latency(np.array(encode_ms)), "scoring": latency(np.array(score_ms))},
+        {"benchmark": "stages", "endpoint": "/chat/", "samples": args.stage_samples,
+         "encode": latency(np.array(chat_encode_ms)), "retrieval": latency(np.array(retrieve_ms))},
+    ]
+
+
+async def benchmark_in_process(args, rng) -> List[Dict]:
+    import httpx
+
+    configure_in_process(args)
+    import recommendation_backend as backend
+
+    started = time.perf_counter()
+    backend.warm_up()
+    settings = {
+        "mode": "in-process",
+        "cache": args.cache,
+        "llm_backend": backend.llm.name,
+        "scoring_mode": backend.SCORING_MODE,
+        "index": backend.INDEX_NAME,
+        "encoder": backend.get_model().name,
+        "load_s": round(time.perf_counter() - started, 3),
+    }
+
+    async def server_stats():
+        return {"rss_bytes": rss_bytes(), "smaps": memory_breakdown()}
+
+    results = stage_timings(backend, args, rng) if args.stage_samples else []
+    try:
+        transport = httpx.ASGITransport(app=backend.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+            results += await run_endpoints(client, args, rng, server_stats)
+    finally:
+        backend.executor.shutdown()
+        await backend.llm.aclose()
+    return [{**settings, **result} for result in results]
+
+
+async def benchmark_http(args, rng) -> List[Dict]:
+    import httpx
+
+    limits = httpx.Limits(max_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=args.url.rstrip("/"), timeout=60, limits=limits) as client:
+        health = (await client.get("/health")).json()
+        if health.get("llm_backend") != "fake":
+            print(f"Warning: server uses the {health.get('llm_backend')} LLM backend, not fake", file=sys.stderr)
+        settings = {"mode": "http", "url": args.url, "llm_backend": health.get("llm_backend")}
+
+        # Memory of whichever worker answers; with several workers each sample may be a different one
+        async def server_stats():
+            memory = (await client.get("/metrics")).json()["memory"]
+            return {"rss_bytes": memory["rss_bytes"], "smaps": memory.get("smaps"), "pid": memory.get("pid")}
+
+        results = await run_endpoints(client, args, rng, server_stats)
+    return [{**settings, **result} for result in results]
+
+
+# --------------------------------------------------
+# On-device recommenders
+# --------------------------------------------------
+
+def benchmark_recommenders(args, rng) -> List[Dict]:
+    """OptimizedYogaRecommender against YogaRecommender on the same profiles"""
+    sys.path.insert(0, APP_PYTHON_DIR)
+    from yoga_recommender import YogaRecommender
+    from yoga_recommender_optimized import OptimizedYogaRecommender
+
+    profiles = sample_profiles(args.recommender_profiles, rng)
+    results, rankings = [], {}
+    # The recommenders log every call; keep stdout for the JSON results
+    with contextlib.redirect_stdout(io.StringIO()):
+        for cls in (YogaRecommender, OptimizedYogaRecommender):
+            rss_before = rss_bytes()
+            started = time.perf_counter()
+            recommender = cls(args.embeddings)
+            recommender.get_recommendations(profiles[0])
+            load_s = time.perf_counter() - started
+
+            timings, names = [], []
+            for profile in profiles:
+                started = time.perf_counter()
+                recommendations = recommender.get_recommendations(profile)
+                timings.append((time.perf_counter() - started) * 1000.0)
+                names.append([rec["name"] for rec in recommendations])
+
+            rankings[cls.__name__] = names
+            results.append({
+                "benchmark": "recommender",
+                "recommender": cls.__name__,
+                "profiles": len(profiles),
+                "load_s": round(load_s, 3),
+                "rss_growth_bytes": rss_bytes() - rss_before,
+                **latency(np.array(timings)),
+            })
+
+    overlaps, same_top1 = [], []
+    for reference, optimized in zip(rankings["YogaRecommender"], rankings["OptimizedYogaRecommender"]):
+        overlaps.append(len(set(reference) & set(optimized)) / max(1, len(reference), len(optimized)))
+        same_top1.append(bool(reference) and bool(optimized) and reference[0] == optimized[0])
+    results.append({
+        "benchmark": "recommender_overlap",
+        "reference": "YogaRecommender",
+        "candidate": "OptimizedYogaRecommender",
+        "profiles": len(profiles),
+        "mean_overlap_at_10": round(float(np.mean(overlaps)), 4),
+        "min_overlap_at_10": round(float(np.min(overlaps)), 4),
+        "same_top1": round(float(np.mean(same_top1)), 4),
+    })
+    return results
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backend endpoints and the on-device recommenders")
+    parser.add_argument("--url", help="benchmark a running server instead of the app in-process")
+    parser.add_argument("--endpoints", nargs="*", default=["recommend", "chat"], choices=["recommend", "chat"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and concurrency")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed requests per endpoint first")
+    parser.add_argument("--cache", choices=["warm", "cold"], default="warm", help="in-process only")
+    parser.add_argument("--llm-delay-ms", type=float, default=0.0, help="fake LLM per-token delay, in-process only")
+    parser.add_argument("--stage-samples", type=int, default=50, help="encode/scoring samples in-process, 0 to skip")
+    parser.add_argument("--recommenders", action="store_true", help="also compare the on-device recommenders")
+    parser.add_argument("--recommender-profiles", type=int, default=50)
+    parser.add_argument("--embeddings", default=os.path.join(HERE, "yoga_embeddings.pkl"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="append results to this JSONL file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = []
+    if args.endpoints:
+        run = benchmark_http if args.url else benchmark_in_process
+        results += asyncio.run(run(args, rng))
+    if args.recommenders:
+        results += benchmark_recommenders(args, rng)
+
+    run_info = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+    }
+    lines = [json.dumps({**run_info, **result}) for result in results]
+    for line in lines:
+        print(line)
+    if args.out:
+        with open(args.out, "a") as f:
+            f.write("".join(line + "\n" for line in lines))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Recall and latency of the approximate vector indexes against exact search
+
+Uses an embedding column of the pose store, or synthetic clustered unit
+vectors to stand in for a larger knowledge base:
+
+    python benchmark_index.py --store yoga_embeddings_store --column Benefits_emb
+    python benchmark_index.py --synthetic 100000 --kinds ivf ivfpq --nprobe 4 8 16 32
+    python benchmark_index.py --synthetic 100000 --kinds quantized
+
+Queries are noisy copies of indexed vectors (the catalog case) mixed with
+random directions. Prints one JSON object per configuration with recall@k
+against ExactIndex, search latency percentiles and the bytes each index
+keeps in memory for scoring (quantized and ivfpq codes).
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from vector_index import ExactIndex, build_index
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int, rng) -> np.ndarray:
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=n)] + 0.5 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(vectors: np.ndarray, count: int, rng) -> np.ndarray:
+    near = vectors[rng.integers(len(vectors), size=count // 2)]
+    near = near + 0.3 * rng.normal(size=near.shape).astype(np.float32) / np.sqrt(vectors.shape[1])
+    far = rng.normal(size=(count - len(near), vectors.shape[1])).astype(np.float32)
+    queries = np.vstack([near, far])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def run(index, queries, k):
+    results, timings = [], []
+    for query in queries:
+        started = time.perf_counter()
+        ids, _ = index.search(query, k)
+        timings.append((time.perf_counter() - started) * 1000.0)
+        results.append(ids)
+    return results, np.array(timings)
+
+
+def recall_at_k(results, exact_results) -> float:
+    recall = np.mean([
+        len(np.intersect1d(found, truth)) / max(1, len(truth))
+        for found, truth in zip(results, exact_results)
+    ])
+    return round(float(recall), 4)
+
+
+def latency(timings):
+    return {
+        "p50_ms": round(float(np.percentile(timings, 50)), 4),
+        "p95_ms": round(float(np.percentile(timings, 95)), 4),
+        "p99_ms": round(float(np.percentile(timings, 99)), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark approximate vector indexes against exact search")
+    parser.add_argument("--store", help="pose store directory")
+    parser.add_argument("--column", default="Benefits_emb")
+    parser.add_argument("--synthetic", type=int, default=0, help="number of synthetic vectors instead of a store")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--kinds", nargs="+", default=["ivf", "ivfpq"], choices=["quantized", "ivf", "ivfpq", "hnsw"])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--ef", type=int, nargs="+", default=[32, 64, 128])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim, max(1, args.synthetic // 500), rng)
+    elif args.store:
+        from pose_store import PoseStore
+        vectors = np.asarray(PoseStore(args.store).embeddings(args.column), dtype=np.float32)
+    else:
+        parser.error("pass --store or --synthetic")
+
+    queries = make_queries(vectors, args.queries, rng)
+    exact_results, exact_timings = run(ExactIndex(vectors), queries, args.k)
+    print(json.dumps({
+        "kind": "exact", "vectors": len(vectors), "recall": 1.0,
+        "scoring_bytes": int(vectors.nbytes), **latency(exact_timings),
+    }))
+
+    for kind in args.kinds:
+        if kind == "quantized":
+            index = build_index(kind, vectors, precision="int8")
+            results, timings = run(index, queries, args.k)
+            print(json.dumps({
+                "kind": kind,
+                "vectors": len(vectors),
+                "params": index.params(),
+                "recall": recall_at_k(results, exact_results),
+                "scoring_bytes": int(index.codes.nbytes + index.scales.nbytes),
+                **latency(timings),
+            }))
+            continue
+
+        started = time.perf_counter()
+        index = build_index(kind, vectors, seed=args.seed)
+        build_s = time.perf_counter() - started
+
+        for setting in (args.ef if kind == "hnsw" else args.nprobe):
+            if kind == "hnsw":
+                index.ef = setting
+                index.index.set_ef(setting)
+            else:
+                index.nprobe = setting
+            results, timings = run(index, queries, args.k)
+            print(json.dumps({
+                "kind": kind,
+                "vectors": len(vectors),
+                "params": index.params(),
+                "build_s": round(build_s, 2),
+                "recall": recall_at_k(results, exact_results),
+                **latency(timings),
+            }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+LRU cache of query embeddings with TTL
+
+Recommendation queries are built from the small fixed vocabulary of the
+onboarding screens, so most of them repeat. Keys are the normalized query
+text (lowercased, whitespace collapsed), which all-MiniLM-L6-v2 encodes
+identically since its tokenizer is uncased.
+
+Configured from the environment:
+    QUERY_CACHE_MAX_ENTRIES   default 2048
+    QUERY_CACHE_MAX_BYTES     default 8 MiB of embedding data
+    QUERY_CACHE_TTL_S         default 3600, 0 disables expiry
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 8 << 20, ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds
+
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls) -> "QueryEmbeddingCache":
+        return cls(
+            max_entries=int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "2048")),
+            max_bytes=int(os.getenv("QUERY_CACHE_MAX_BYTES", str(8 << 20))),
+            ttl_seconds=float(os.getenv("QUERY_CACHE_TTL_S", "3600")),
+        )
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Look up an already-normalized query; returns None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            emb, stored_at = entry
+            if self.ttl and time.monotonic() - stored_at > self.ttl:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return emb
+
+    def put(self, key: str, emb: np.ndarray):
+        # Cached arrays are shared between requests, so make them read-only
+        emb = np.array(emb, copy=True)
+        emb.setflags(write=False)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if emb.nbytes > self.max_bytes:
+                return
+
+            self._entries[key] = (emb, time.monotonic())
+            self._bytes += emb.nbytes
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        emb, _ = self._entries.pop(key)
+        self._bytes -= emb.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,105 @@
+"""
+Sentence encoders for query embeddings
+
+Both backends produce the all-MiniLM-L6-v2 sentence embedding: token
+embeddings mean-pooled over the attention mask, then L2-normalized.
+
+    torch   sentence-transformers on PyTorch (default)
+    onnx    the same model exported by export_onnx.py and run by onnxruntime,
+            with the tokenizer from the tokenizers package; torch is never
+            imported, which saves its import time and most of its RSS
+
+Configured from the environment:
+    ENCODER_BACKEND      torch (default) or onnx
+    ENCODER_MODEL        model for the torch backend (default sentence-transformers/all-MiniLM-L6-v2)
+    ONNX_MODEL_DIR       directory written by export_onnx.py (default onnx_model)
+    ONNX_MODEL_FILE      model.onnx or model_quantized.onnx (default model_quantized.onnx)
+    ONNX_THREADS         intra-op threads for onnxruntime (default 0: onnxruntime decides)
+"""
+
+import json
+import os
+from typing import List
+
+import numpy as np
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+ENCODER_BACKENDS = ("torch", "onnx")
+
+
+def mean_pool(token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """Mean of the token embeddings over real (unpadded) tokens, then L2-normalized"""
+    mask = attention_mask[..., None].astype(np.float32)
+    summed = (token_embeddings * mask).sum(axis=1)
+    pooled = summed / np.maximum(mask.sum(axis=1), 1e-9)
+    norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+    return (pooled / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+class TorchEncoder:
+    name = "torch"
+
+    def __init__(self, model_name: str = DEFAULT_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+
+class OnnxEncoder:
+    name = "onnx"
+
+    def __init__(self, model_dir: str, model_file: str = "model_quantized.onnx", threads: int = 0):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, "encoder_config.json")) as f:
+            self.config = json.load(f)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        batch = self.tokenizer.encode_batch(list(texts))
+        input_ids = np.array([e.ids for e in batch], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in batch], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in batch], dtype=np.int64)
+
+        token_embeddings = self.session.run(["last_hidden_state"], feeds)[0]
+        return mean_pool(token_embeddings, attention_mask)
+
+
+def encoder_version() -> str:
+    """
+    Identifies the query encoder configured in the environment, without loading it
+    Query embeddings, and everything ranked from them, differ between encoders
+    """
+    backend = os.getenv("ENCODER_BACKEND", "torch")
+    if backend == "onnx":
+        return f"onnx:{os.getenv('ONNX_MODEL_FILE', 'model_quantized.onnx')}"
+    return f"{backend}:{os.getenv('ENCODER_MODEL', DEFAULT_MODEL)}"
+
+
+def load_encoder():
+    backend = os.getenv("ENCODER_BACKEND", "torch")
+    if backend == "torch":
+        return TorchEncoder(os.getenv("ENCODER_MODEL", DEFAULT_MODEL))
+    if backend == "onnx":
+        return OnnxEncoder(
+            os.getenv("ONNX_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_model")),
+            model_file=os.getenv("ONNX_MODEL_FILE", "model_quantized.onnx"),
+            threads=int(os.getenv("ONNX_THREADS", "0")),
+        )
+    raise ValueError(f"Unknown ENCODER_BACKEND: {backend} (expected one of {', '.join(ENCODER_BACKENDS)})")
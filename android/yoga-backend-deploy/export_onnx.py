@@ -0,0 +1,156 @@
+"""
+Export the sentence encoder to ONNX for ENCODER_BACKEND=onnx
+
+Writes into the output directory:
+
+    model.onnx              float32 transformer, outputs last_hidden_state
+    model_quantized.onnx    same graph with dynamically quantized int8 weights
+    tokenizer.json          the model's fast tokenizer
+    encoder_config.json     max sequence length and padding token
+
+Both models are then checked against sentence-transformers on sample
+queries, and the script exits non-zero if either is out of tolerance:
+
+    model.onnx              every embedding component within 1e-4 of torch
+    model_quantized.onnx    cosine similarity to the torch embedding >= 0.98
+                            for every sample
+
+How often each sample's nearest other sample is unchanged is reported too.
+
+Needs torch, sentence-transformers, onnx and onnxruntime; only onnxruntime
+and tokenizers are needed at serving time.
+
+    python export_onnx.py [--model sentence-transformers/all-MiniLM-L6-v2] [--out onnx_model]
+"""
+
+import argparse
+import inspect
+import json
+import os
+import sys
+
+import numpy as np
+
+from encoders import DEFAULT_MODEL, OnnxEncoder
+from precompute_responses import GOAL_OPTIONS, MENTAL_OPTIONS, PHYSICAL_OPTIONS
+
+FLOAT32_MAX_ABS_DIFF = 1e-4
+QUANTIZED_MIN_COSINE = 0.98
+
+SAMPLE_QUERIES = (
+    GOAL_OPTIONS + PHYSICAL_OPTIONS + MENTAL_OPTIONS + [
+        "weight loss back pain knee pain stress",
+        "What yoga poses help with back pain?",
+        "poses for lower back pain",
+        "Is it safe to do inversions with high blood pressure?",
+        "How should I breathe during sun salutations?",
+        "",
+        # Longer than the model's sequence limit, to check truncation matches
+        " ".join(["gentle hip opening stretches for tight hamstrings after running"] * 60),
+    ]
+)
+
+
+def export(model_name: str, out_dir: str, opset: int):
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    st = SentenceTransformer(model_name, device="cpu")
+    pooling = st[1]
+    # sentence-transformers 2.x flags the mode; newer releases name it
+    mean_pooling = getattr(pooling, "pooling_mode_mean_tokens", False) or getattr(pooling, "pooling_mode", None) == "mean"
+    if not mean_pooling:
+        raise ValueError(f"{model_name} does not use mean pooling; the onnx encoder only implements mean pooling")
+
+    transformer = st[0].auto_model.eval()
+    tokenizer = st.tokenizer
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            ).last_hidden_state
+
+    os.makedirs(out_dir, exist_ok=True)
+    model_path = os.path.join(out_dir, "model.onnx")
+    sample = tokenizer(["a sample query", "another one"], padding=True, return_tensors="pt")
+    dynamic = {0: "batch", 1: "sequence"}
+
+    # Newer torch defaults to the dynamo exporter; the TorchScript one handles these dynamic axes
+    kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(transformer),
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            model_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": dynamic, "attention_mask": dynamic,
+                "token_type_ids": dynamic, "last_hidden_state": dynamic,
+            },
+            opset_version=opset,
+            **kwargs,
+        )
+
+    quantize_dynamic(model_path, os.path.join(out_dir, "model_quantized.onnx"), weight_type=QuantType.QInt8)
+
+    tokenizer.backend_tokenizer.save(os.path.join(out_dir, "tokenizer.json"))
+    with open(os.path.join(out_dir, "encoder_config.json"), "w") as f:
+        json.dump({
+            "model": model_name,
+            "dim": st.get_sentence_embedding_dimension(),
+            "max_seq_length": st.max_seq_length,
+            "pad_token": tokenizer.pad_token,
+            "pad_token_id": tokenizer.pad_token_id,
+        }, f, indent=2)
+
+    return st
+
+
+def verify(st, out_dir: str) -> bool:
+    """Compare both exported models with sentence-transformers on SAMPLE_QUERIES"""
+    reference = st.encode(list(SAMPLE_QUERIES), normalize_embeddings=True)
+    reference_nearest = np.argsort(-(reference @ reference.T), axis=1)[:, 1]
+
+    passed = True
+    for model_file in ("model.onnx", "model_quantized.onnx"):
+        embs = OnnxEncoder(out_dir, model_file).encode(list(SAMPLE_QUERIES))
+        max_abs_diff = float(np.abs(embs - reference).max())
+        cosines = (embs * reference).sum(axis=1)
+        same_nearest = float(np.mean(np.argsort(-(embs @ embs.T), axis=1)[:, 1] == reference_nearest))
+
+        if model_file == "model.onnx":
+            ok = max_abs_diff <= FLOAT32_MAX_ABS_DIFF
+        else:
+            ok = cosines.min() >= QUANTIZED_MIN_COSINE
+        passed &= ok
+
+        print(
+            f"{model_file}: max |diff| {max_abs_diff:.2e}, min cosine {cosines.min():.5f}, "
+            f"mean cosine {cosines.mean():.5f}, same nearest sample {same_nearest:.0%} "
+            f"-> {'ok' if ok else 'OUT OF TOLERANCE'}"
+        )
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the sentence encoder to ONNX and check it against torch")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_model"))
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+
+    st = export(args.model, args.out, args.opset)
+    print(f"Exported {args.model} to {args.out}")
+    if not verify(st, args.out):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
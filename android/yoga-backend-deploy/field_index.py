@@ -0,0 +1,70 @@
+"""
+Multi-field retrieval index
+
+Stacks several per-pose embedding fields side by side into one contiguous
+(num_poses, num_fields * dim) float32 matrix and records each field's column
+offsets. A weighted query over several fields,
+
+    sum_f  w_f * cos(q_f, E_f[i])
+
+is the dot product of row i with the concatenation of the weighted field
+queries [w_1 q_1 | w_2 q_2 | ...], so scoring every pose is one GEMV
+however many fields take part. Fields without weight get a zero block.
+
+Contraindication exclusion works on a field's column block directly: one
+(num_poses, dim) @ (dim, num_issues) product, thresholded into a boolean mask.
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+class MultiFieldIndex:
+    def __init__(self, fields: Dict[str, np.ndarray]):
+        if not fields:
+            raise ValueError("MultiFieldIndex needs at least one field")
+
+        shapes = {name: emb.shape for name, emb in fields.items()}
+        num_rows = {shape[0] for shape in shapes.values()}
+        dims = {shape[1] for shape in shapes.values()}
+        if len(num_rows) != 1 or len(dims) != 1:
+            raise ValueError(f"Fields must share row count and dimension, got {shapes}")
+
+        self.num_rows = num_rows.pop()
+        self.dim = dims.pop()
+        self.fields: List[str] = list(fields)
+        self.offsets: Dict[str, Tuple[int, int]] = {}
+
+        self.matrix = np.empty((self.num_rows, self.dim * len(self.fields)), dtype=np.float32)
+        for f, name in enumerate(self.fields):
+            start, stop = f * self.dim, (f + 1) * self.dim
+            emb = np.asarray(fields[name], dtype=np.float32)
+            # Unit rows so each block's dot product is a cosine similarity
+            norms = np.linalg.norm(emb, axis=1, keepdims=True)
+            np.divide(emb, np.maximum(norms, 1e-12), out=self.matrix[:, start:stop])
+            self.offsets[name] = (start, stop)
+
+    def field(self, name: str) -> np.ndarray:
+        """Column block of one field, a (num_poses, dim) view into the stacked matrix"""
+        start, stop = self.offsets[name]
+        return self.matrix[:, start:stop]
+
+    def query_vector(self, terms: Sequence[Tuple[str, float, np.ndarray]]) -> np.ndarray:
+        """
+        Stacked query for (field, weight, query embedding) terms; weights are
+        normalized by their total, and terms on the same field add up
+        """
+        total = sum(weight for _, weight, _ in terms)
+        query = np.zeros(self.matrix.shape[1], dtype=np.float32)
+        for name, weight, emb in terms:
+            start, stop = self.offsets[name]
+            query[start:stop] += (weight / total) * np.asarray(emb, dtype=np.float32)
+        return query
+
+    def mask_similar(self, name: str, query_embs: np.ndarray, threshold: float) -> np.ndarray:
+        """Boolean mask of poses whose field is more similar than threshold to any query"""
+        query_embs = np.atleast_2d(np.asarray(query_embs, dtype=np.float32))
+        if query_embs.shape[0] == 0:
+            return np.zeros(self.num_rows, dtype=bool)
+        return (self.field(name) @ query_embs.T > threshold).any(axis=1)
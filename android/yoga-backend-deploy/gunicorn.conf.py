@@ -0,0 +1,57 @@
+"""
+Pre-fork multi-worker serving
+
+    gunicorn -c gunicorn.conf.py recommendation_backend:app
+
+The master imports the app and loads the pose store, indexes, caches and the
+torch model weights (recommendation_backend.preload) before forking, so the
+workers share those pages copy-on-write instead of holding N copies. Objects
+alive at that point are moved to gc's permanent generation (gc.freeze), so
+collections in the workers never write to them and unshare their pages.
+Each worker then runs its own warm-up encode and reports ready on /readyz.
+
+Per-worker RSS, PSS and shared/private bytes are in /metrics under memory.smaps,
+and are logged as each worker boots.
+
+Configured from the environment:
+    PORT                listen port (default 8080)
+    WEB_CONCURRENCY     worker processes (default: CPUs available to the container)
+    OMP_NUM_THREADS     torch threads per worker (default: CPUs / workers, at least 1)
+    ONNX_THREADS        onnxruntime threads per worker (same default)
+"""
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(len(os.sched_getaffinity(0)))))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+keepalive = 120
+
+# Split the cores between workers instead of every worker using all of them;
+# set before the app (and torch) is imported by preload_app
+threads_per_worker = str(max(1, len(os.sched_getaffinity(0)) // workers))
+os.environ.setdefault("OMP_NUM_THREADS", threads_per_worker)
+os.environ.setdefault("ONNX_THREADS", threads_per_worker)
+
+
+def on_starting(server):
+    # preload_app has imported the app by now; load the shared data before any fork
+    import recommendation_backend
+
+    recommendation_backend.preload()
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"Preloaded shared data, froze {gc.get_freeze_count()} objects")
+
+
+def post_worker_init(worker):
+    from memory import memory_breakdown
+
+    breakdown = memory_breakdown() or {}
+    worker.log.info(
+        f"Worker {worker.pid}: rss {breakdown.get('rss_bytes', 0) >> 20} MiB, "
+        f"shared {(breakdown.get('shared_clean_bytes', 0) + breakdown.get('shared_dirty_bytes', 0)) >> 20} MiB"
+    )
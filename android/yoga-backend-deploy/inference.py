@@ -0,0 +1,87 @@
+"""
+Bounded executor for CPU-bound inference work (query encodes, similarity search)
+
+Async handlers await InferenceExecutor.run() instead of calling model.encode
+directly, so the event loop stays free for other requests (including /health).
+When max_queue tasks are already waiting or running, run() raises
+InferenceQueueFull immediately and the app turns that into a 503 with
+Retry-After, instead of letting latency grow with the queue.
+
+The pool is a thread pool: numpy and the encoders release the GIL in their
+heavy kernels, and the model, embeddings and indexes it works on are module
+globals of this process. Parallelism across processes comes from the
+pre-fork gunicorn workers (see gunicorn.conf.py), each with its own pool.
+
+Configured from the environment:
+    INFERENCE_WORKERS       pool size (default 1)
+    INFERENCE_MAX_QUEUE     max tasks queued or running (default 32)
+    INFERENCE_RETRY_AFTER   seconds advertised in Retry-After (default 1)
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the inference queue is at capacity"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    def __init__(self, workers: int = 1, max_queue: int = 32, retry_after: int = 1):
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.retry_after = retry_after
+
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "InferenceExecutor":
+        return cls(
+            workers=int(os.getenv("INFERENCE_WORKERS", "1")),
+            max_queue=int(os.getenv("INFERENCE_MAX_QUEUE", "32")),
+            retry_after=int(os.getenv("INFERENCE_RETRY_AFTER", "1")),
+        )
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        # Created on first use so the pool is never inherited across a fork
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        return self._pool
+
+    async def run(self, fn: Callable, *args):
+        """Run fn(*args) on the pool and await the result"""
+        if self._pending >= self.max_queue:
+            self._rejected += 1
+            raise InferenceQueueFull(self.retry_after)
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_pool(), fn, *args)
+            self._completed += 1
+            return result
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "completed": self._completed,
+            "rejected": self._rejected,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,386 @@
+"""
+Async LLM gateway for /chat/
+
+Providers talk to the model without blocking the event loop. The Gemini
+provider calls the REST API over one pooled httpx.AsyncClient per worker.
+LLMGateway wraps a provider with:
+    - a per-worker concurrency semaphore
+    - a per-attempt timeout
+    - retries with jittered exponential backoff (429, 5xx, timeouts, transport errors)
+    - a circuit breaker that fails fast with LLMUnavailable while the provider is down,
+      so the app can answer from retrieval alone
+
+LLM_BACKEND selects the provider:
+    gemini   Google Gemini REST API (default)
+    fake     local canned generator for tests and load runs; no network or API key
+
+Other settings:
+    LLM_MODEL               Gemini model name (default gemini-2.0-flash)
+    LLM_MAX_CONCURRENCY     in-flight LLM calls per worker (default 8)
+    LLM_MAX_CONNECTIONS     pooled HTTP connections per worker (default 16)
+    LLM_TIMEOUT_S           per-attempt timeout; for streams, per chunk (default 20)
+    LLM_RETRIES             retries after the first attempt (default 2)
+    LLM_BACKOFF_BASE_S      first backoff, doubled per retry (default 0.25)
+    LLM_BACKOFF_MAX_S       backoff cap (default 4)
+    LLM_BREAKER_FAILURES    consecutive failures that open the breaker (default 5)
+    LLM_BREAKER_RESET_S     how long the breaker stays open (default 30)
+    FAKE_LLM_DELAY_MS       per-token delay for the fake provider (default 0)
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+
+class LLMUnavailable(Exception):
+    """The provider failed, timed out, or the circuit breaker is open"""
+
+
+class LLMProvider:
+    """
+    Interface every chat provider implements
+    Each default is written in terms of the other, so a provider overrides at
+    least one of generate() and stream(); this is checked when it is defined
+    """
+
+    name = "base"
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.generate is LLMProvider.generate and cls.stream is LLMProvider.stream:
+            raise TypeError(f"{cls.__name__} must implement generate() or stream()")
+
+    async def generate(self, prompt: str) -> str:
+        """Return the full answer for a prompt"""
+        return "".join([delta async for delta in self.stream(prompt)])
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the answer in chunks as soon as they are produced; one chunk unless overridden"""
+        yield await self.generate(prompt)
+
+    async def aclose(self):
+        pass
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+    base_url = "https://generativelanguage.googleapis.com/v1beta"
+
+    def __init__(self, model_name: str = "gemini-2.0-flash", api_key: str = "", max_connections: int = 16):
+        if not api_key:
+            print("WARNING: GOOGLE_API_KEY not set")
+        self.model_name = model_name
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use, inside the worker's event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"x-goog-api-key": self.api_key},
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                # Overall deadlines are enforced by the gateway
+                timeout=httpx.Timeout(None, connect=10.0),
+            )
+        return self._client
+
+    @staticmethod
+    def _payload(prompt: str) -> Dict:
+        return {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+
+    @staticmethod
+    def _text(response: Dict) -> str:
+        parts: List[Dict] = []
+        for candidate in response.get("candidates", [])[:1]:
+            parts = candidate.get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.client.post(
+            f"/models/{self.model_name}:generateContent", json=self._payload(prompt)
+        )
+        response.raise_for_status()
+        return self._text(response.json())
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        async with self.client.stream(
+            "POST",
+            f"/models/{self.model_name}:streamGenerateContent",
+            params={"alt": "sse"},
+            json=self._payload(prompt),
+        ) as response:
+            if response.is_error:
+                await response.aread()
+                response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    text = self._text(json.loads(line[len("data:"):]))
+                    if text:
+                        yield text
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class FakeProvider(LLMProvider):
+    """Deterministic stand-in that answers from the retrieved pose names in the prompt"""
+
+    name = "fake"
+
+    def __init__(self, delay_ms: float = 0.0):
+        self.delay = delay_ms / 1000.0
+
+    def _answer(self, prompt: str) -> str:
+        poses = [line[len("Pose: "):] for line in prompt.splitlines() if line.startswith("Pose: ")]
+        if poses:
+            return (
+                f"You could try {', '.join(poses)}. "
+                "Move slowly, keep your breath steady, and skip any pose whose contraindications apply to you."
+            )
+        return "Yoga combines breath, movement and rest. Start gently and listen to your body."
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        words = self._answer(prompt).split(" ")
+        for i, word in enumerate(words):
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield word if i == len(words) - 1 else word + " "
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for
+    reset_timeout seconds; then lets one trial call through (half-open)
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    @property
+    def trial_in_flight(self) -> bool:
+        return self._trial_in_flight
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial_in_flight:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def release_trial(self):
+        """The half-open trial ended without a verdict (cancelled); let the next call be the trial"""
+        self._trial_in_flight = False
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, (asyncio.TimeoutError, httpx.TransportError))
+
+
+def _provider_failure(error: Exception) -> bool:
+    """Counts towards opening the breaker: outages, and a revoked or expired key (401/403)"""
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code in (401, 403):
+        return True
+    return _retryable(error)
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        provider: LLMProvider,
+        max_concurrency: int = 8,
+        timeout_s: float = 20.0,
+        retries: int = 2,
+        backoff_base_s: float = 0.25,
+        backoff_max_s: float = 4.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.provider = provider
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout_s
+        self.retries = max(0, retries)
+        self.backoff_base = backoff_base_s
+        self.backoff_max = backoff_max_s
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.retried = 0
+        self.short_circuited = 0
+
+    @classmethod
+    def from_env(cls) -> "LLMGateway":
+        return cls(
+            create_provider(),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            timeout_s=float(os.getenv("LLM_TIMEOUT_S", "20")),
+            retries=int(os.getenv("LLM_RETRIES", "2")),
+            backoff_base_s=float(os.getenv("LLM_BACKOFF_BASE_S", "0.25")),
+            backoff_max_s=float(os.getenv("LLM_BACKOFF_MAX_S", "4")),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv("LLM_BREAKER_RESET_S", "30")),
+            ),
+        )
+
+    @property
+    def name(self) -> str:
+        return self.provider.name
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _admit(self) -> bool:
+        """Count the call or fail fast; True when it is the breaker's half-open trial"""
+        if not self.breaker.allow():
+            self.short_circuited += 1
+            raise LLMUnavailable("LLM circuit breaker is open")
+        self.calls += 1
+        return self.breaker.trial_in_flight
+
+    def _release(self, trial: bool):
+        # A trial cancelled before success or failure was recorded (request timeout,
+        # client disconnect, SSE consumer gone) must not keep the breaker open for good
+        if trial and self.breaker.trial_in_flight:
+            self.breaker.release_trial()
+
+    def _fail(self, error: Exception) -> LLMUnavailable:
+        self.failures += 1
+        # Our own bad requests and unparseable responses say nothing about the provider
+        # either way, so they leave the consecutive-failure count as it is
+        if _provider_failure(error):
+            self.breaker.record_failure()
+        return LLMUnavailable(f"LLM call failed: {error!r}")
+
+    async def generate(self, prompt: str) -> str:
+        trial = self._admit()
+        try:
+            async with self._semaphore:
+                self.in_flight += 1
+                try:
+                    for attempt in range(self.retries + 1):
+                        try:
+                            result = await asyncio.wait_for(self.provider.generate(prompt), self.timeout)
+                        except Exception as e:
+                            if attempt < self.retries and _retryable(e):
+                                self.retried += 1
+                                await asyncio.sleep(self._backoff(attempt))
+                                continue
+                            raise self._fail(e) from e
+                        self.breaker.record_success()
+                        return result
+                finally:
+                    self.in_flight -= 1
+        finally:
+            self._release(trial)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Stream chunks with the timeout applied to each chunk
+        Retries only happen before the first chunk; after that a failure ends the stream
+        """
+        trial = self._admit()
+        try:
+            async with self._semaphore:
+                self.in_flight += 1
+                try:
+                    for attempt in range(self.retries + 1):
+                        started = False
+                        chunks = self.provider.stream(prompt)
+                        try:
+                            while True:
+                                try:
+                                    delta = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                                except StopAsyncIteration:
+                                    break
+                                started = True
+                                yield delta
+                        except Exception as e:
+                            if not started and attempt < self.retries and _retryable(e):
+                                self.retried += 1
+                                await asyncio.sleep(self._backoff(attempt))
+                                continue
+                            raise self._fail(e) from e
+                        finally:
+                            await chunks.aclose()
+                        self.breaker.record_success()
+                        return
+                finally:
+                    self.in_flight -= 1
+        finally:
+            self._release(trial)
+
+    async def aclose(self):
+        await self.provider.aclose()
+
+    def stats(self) -> Dict:
+        return {
+            "provider": self.provider.name,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "failures": self.failures,
+            "retried": self.retried,
+            "short_circuited": self.short_circuited,
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.times_opened,
+        }
+
+
+def create_provider() -> LLMProvider:
+    kind = os.getenv("LLM_BACKEND", "gemini")
+    if kind == "gemini":
+        return GeminiProvider(
+            model_name=os.getenv("LLM_MODEL", "gemini-2.0-flash"),
+            api_key=os.getenv("GOOGLE_API_KEY", ""),
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "16")),
+        )
+    if kind == "fake":
+        return FakeProvider(delay_ms=float(os.getenv("FAKE_LLM_DELAY_MS", "0")))
+    raise ValueError(f"Unknown LLM_BACKEND: {kind}")
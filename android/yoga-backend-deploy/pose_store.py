@@ -0,0 +1,291 @@
+"""
+Columnar on-disk store for the yoga pose table
+
+Converts the pickled DataFrame in yoga_embeddings.pkl into a directory of
+plain files that can be memory-mapped at startup:
+
+    manifest.json           schema, format version and source checksum
+    <column>.npy            embedding columns as one contiguous (poses x dim) matrix
+    <column>.npy            numeric columns as a 1-D array
+    <column>.offsets.npy    text columns: int64 offsets into the UTF-8 blob
+    <column>.utf8           text columns: concatenated UTF-8 bytes
+
+Build once (the Dockerfile does this at image build time):
+
+    python pose_store.py yoga_embeddings.pkl yoga_embeddings_store [--dtype float16]
+
+The store path is a symlink to a versioned sibling directory
+(.yoga_embeddings_store.v<ns>). A rebuild writes a new version and switches
+the symlink with os.replace, so readers see either the old store or the new
+one, never a missing or half-written one. Builds are serialized by a lock
+file next to the store.
+"""
+
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+STORE_FORMAT = "yoga-pose-store"
+STORE_VERSION = 1
+EMBEDDING_SUFFIX = "_emb"
+
+
+def _file_name(column: str) -> str:
+    """Column names contain spaces; keep them readable but filesystem safe"""
+    return column.replace(" ", "_").replace("/", "_")
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# --------------------------------------------------
+# Versioned directories
+# --------------------------------------------------
+
+@contextlib.contextmanager
+def build_lock(out_dir: str):
+    """Exclusive lock held while out_dir is rebuilt, shared by processes on this host"""
+    out_dir = os.path.abspath(out_dir)
+    os.makedirs(os.path.dirname(out_dir), exist_ok=True)
+    with open(f"{out_dir}.lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def publish_directory(tmp_dir: str, out_dir: str):
+    """
+    Make a fully written tmp_dir visible at out_dir in one atomic step
+    tmp_dir becomes a versioned sibling and out_dir a symlink to it, switched
+    with os.replace. The version it replaces is kept, since running workers
+    may still read from it; older versions are removed. Call under build_lock
+    """
+    out_dir = os.path.abspath(out_dir)
+    parent, name = os.path.split(out_dir)
+    stamp = time.time_ns()
+    version_dir = os.path.join(parent, f".{name}.v{stamp}")
+    os.rename(tmp_dir, version_dir)
+
+    previous = None
+    if os.path.islink(out_dir):
+        previous = os.path.basename(os.readlink(out_dir))
+    elif os.path.isdir(out_dir):
+        # A plain directory from before stores were versioned: move it aside once.
+        # This is the only rebuild with a moment where out_dir does not exist.
+        previous = f".{name}.v0"
+        os.rename(out_dir, os.path.join(parent, previous))
+
+    link = os.path.join(parent, f".{name}.link{stamp}")
+    os.symlink(os.path.basename(version_dir), link)
+    os.replace(link, out_dir)
+
+    keep = {os.path.basename(version_dir), previous}
+    for entry in os.listdir(parent):
+        if entry.startswith(f".{name}.v") and entry not in keep:
+            shutil.rmtree(os.path.join(parent, entry), ignore_errors=True)
+
+
+# --------------------------------------------------
+# Build step
+# --------------------------------------------------
+
+def build_store(pkl_path: str, out_dir: str, dtype: str = "float32") -> Dict:
+    """
+    Convert the pickled pose DataFrame into a columnar store directory
+    The directory is written to a temporary location and published atomically
+    (see publish_directory), so a running server never sees a missing or
+    half-written store
+    """
+    with build_lock(out_dir):
+        return _build_store(pkl_path, out_dir, dtype)
+
+
+def _build_store(pkl_path: str, out_dir: str, dtype: str) -> Dict:
+    if dtype not in ("float32", "float16"):
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+    with open(pkl_path, "rb") as f:
+        df = pickle.load(f)
+
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    tmp_dir = tempfile.mkdtemp(prefix=".pose_store_", dir=parent)
+
+    columns = {}
+    for column in df.columns:
+        base = _file_name(column)
+        values = df[column]
+
+        if column.endswith(EMBEDDING_SUFFIX):
+            matrix = np.ascontiguousarray(np.vstack(values.values), dtype=dtype)
+            np.save(os.path.join(tmp_dir, f"{base}.npy"), matrix)
+            columns[column] = {
+                "kind": "embedding",
+                "file": f"{base}.npy",
+                "dtype": dtype,
+                "dim": int(matrix.shape[1]),
+            }
+        elif np.issubdtype(values.dtype, np.number):
+            array = np.ascontiguousarray(values.to_numpy())
+            np.save(os.path.join(tmp_dir, f"{base}.npy"), array)
+            columns[column] = {"kind": "numeric", "file": f"{base}.npy", "dtype": str(array.dtype)}
+        else:
+            # Missing text is stored as an empty string
+            encoded = [b"" if text is None or text != text else str(text).encode("utf-8") for text in values]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+            np.save(os.path.join(tmp_dir, f"{base}.offsets.npy"), offsets)
+            with open(os.path.join(tmp_dir, f"{base}.utf8"), "wb") as f:
+                f.write(b"".join(encoded))
+            columns[column] = {"kind": "text", "offsets": f"{base}.offsets.npy", "data": f"{base}.utf8"}
+
+    manifest = {
+        "format": STORE_FORMAT,
+        "version": STORE_VERSION,
+        "num_poses": len(df),
+        "columns": columns,
+        "source": {"file": os.path.basename(pkl_path), "sha256": _sha256(pkl_path)},
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    publish_directory(tmp_dir, out_dir)
+    return manifest
+
+
+# --------------------------------------------------
+# Loader
+# --------------------------------------------------
+
+class StringTable:
+    """Read-only list of strings backed by an offsets array and a UTF-8 blob"""
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return bytes(self.data[start:end]).decode("utf-8")
+
+    def tolist(self) -> List[str]:
+        return [self[i] for i in range(len(self))]
+
+
+class PoseStore:
+    """
+    Memory-mapped view of a store directory written by build_store
+    Embedding and numeric arrays are zero-copy, so several worker processes
+    reading the same store share the same page-cache pages
+    """
+
+    def __init__(self, path: str):
+        # Resolve the symlink once, so columns loaded later come from the same version
+        # even if the store is rebuilt meanwhile
+        self.path = os.path.realpath(path)
+        with open(os.path.join(path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+
+        if self.manifest.get("format") != STORE_FORMAT:
+            raise ValueError(f"{path} is not a pose store")
+        if self.manifest.get("version") != STORE_VERSION:
+            raise ValueError(
+                f"Unsupported pose store version {self.manifest.get('version')} (expected {STORE_VERSION})"
+            )
+
+        self.columns = self.manifest["columns"]
+        self._cache = {}
+
+    def __len__(self) -> int:
+        return self.manifest["num_poses"]
+
+    @property
+    def version(self) -> str:
+        """Identifies the data in this store; changes whenever the source pickle changes"""
+        return f"{self.manifest['version']}:{self.manifest['source']['sha256'][:16]}"
+
+    def _column(self, name: str, kind: str) -> Dict:
+        if name not in self.columns:
+            raise KeyError(f"Column not in pose store: {name}")
+        info = self.columns[name]
+        if info["kind"] != kind:
+            raise TypeError(f"Column {name} is {info['kind']}, not {kind}")
+        return info
+
+    def embeddings(self, name: str) -> np.ndarray:
+        """(poses x dim) read-only memory-mapped matrix for an embedding column"""
+        if name not in self._cache:
+            info = self._column(name, "embedding")
+            self._cache[name] = np.load(os.path.join(self.path, info["file"]), mmap_mode="r")
+        return self._cache[name]
+
+    def numeric(self, name: str) -> np.ndarray:
+        if name not in self._cache:
+            info = self._column(name, "numeric")
+            self._cache[name] = np.load(os.path.join(self.path, info["file"]), mmap_mode="r")
+        return self._cache[name]
+
+    def text(self, name: str) -> StringTable:
+        if name not in self._cache:
+            info = self._column(name, "text")
+            offsets = np.load(os.path.join(self.path, info["offsets"]), mmap_mode="r")
+            data_path = os.path.join(self.path, info["data"])
+            # np.memmap refuses zero-length files
+            if os.path.getsize(data_path):
+                data = np.memmap(data_path, dtype=np.uint8, mode="r")
+            else:
+                data = np.zeros(0, dtype=np.uint8)
+            self._cache[name] = StringTable(offsets, data)
+        return self._cache[name]
+
+
+def _stale(store_path: str, pkl_path: str) -> bool:
+    manifest_path = os.path.join(store_path, "manifest.json")
+    return not os.path.exists(manifest_path) or (
+        os.path.exists(pkl_path) and os.path.getmtime(pkl_path) > os.path.getmtime(manifest_path)
+    )
+
+
+def open_store(store_path: str, pkl_path: str) -> PoseStore:
+    """Open the store, building it from the pickle first if it is missing or stale"""
+    if _stale(store_path, pkl_path):
+        with build_lock(store_path):
+            # Another process may have rebuilt it while we waited for the lock
+            if _stale(store_path, pkl_path):
+                print(f"Building pose store at {store_path} from {pkl_path}")
+                _build_store(pkl_path, store_path, "float32")
+    return PoseStore(store_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the columnar pose store from yoga_embeddings.pkl")
+    parser.add_argument("pkl_path")
+    parser.add_argument("out_dir")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    args = parser.parse_args()
+
+    manifest = build_store(args.pkl_path, args.out_dir, dtype=args.dtype)
+    print(f"Wrote {manifest['num_poses']} poses, {len(manifest['columns'])} columns to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
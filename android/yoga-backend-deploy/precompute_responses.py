@@ -0,0 +1,73 @@
+"""
+Offline job: precompute /recommend/ responses for every onboarding profile
+
+Enumerates every combination of the options offered by the Android preference
+screens (one goal or none, any subset of the physical problem areas, with or
+without stress) and writes the serialized responses to the file the backend
+loads at startup.
+
+    python precompute_responses.py [--out recommendation_cache.jsonl] [--batch-size 64]
+"""
+
+import argparse
+import itertools
+import os
+from typing import Dict, Iterator, List
+
+# Preference2Fragment (single choice)
+GOAL_OPTIONS = [
+    "weight loss", "flexibility", "core strength", "stress relief",
+    "better posture", "digestion", "endurance", "relaxation",
+]
+
+# Preference1Fragment problem areas; UserProfile.getPhysicalIssues() moves "stress" to mental issues
+PHYSICAL_OPTIONS = [
+    "back pain", "knee pain", "shoulder pain", "neck pain",
+    "joint stiffness", "low flexibility", "digestive issues", "balance issues",
+]
+MENTAL_OPTIONS = ["stress"]
+
+
+def _subsets(options: List[str]) -> Iterator[List[str]]:
+    for r in range(len(options) + 1):
+        for combo in itertools.combinations(options, r):
+            yield list(combo)
+
+
+def onboarding_profiles() -> Iterator[Dict]:
+    """Every profile the onboarding screens can produce, ignoring free-text mental issues"""
+    for goals in [[]] + [[goal] for goal in GOAL_OPTIONS]:
+        for physical in _subsets(PHYSICAL_OPTIONS):
+            for mental in _subsets(MENTAL_OPTIONS):
+                yield {"goals": goals, "physical_issues": physical, "mental_issues": mental}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute /recommend/ responses for onboarding profiles")
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "recommendation_cache.jsonl"))
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    import recommendation_backend as backend
+    backend.warm_up()
+    from embedding_cache import normalize_query
+    from response_cache import canonical_profile, serialize_response, write_precomputed
+
+    profiles = list({backend.response_cache.key(p): p for p in map(canonical_profile, onboarding_profiles())}.items())
+    print(f"Precomputing {len(profiles)} profiles for version {backend.response_cache.version}")
+
+    def entries():
+        for start in range(0, len(profiles), args.batch_size):
+            chunk = profiles[start:start + args.batch_size]
+            queries = [backend.profile_queries(profile) for _, profile in chunk]
+            embs = iter(backend.encode_batch([normalize_query(text) for texts in queries for text in texts]))
+            for (key, profile), texts in zip(chunk, queries):
+                query_embs = [next(embs) for _ in texts]
+                yield key, serialize_response({"recommended_asanas": backend.rank_profile(profile, query_embs)})
+
+    count = write_precomputed(args.out, backend.response_cache.version, entries())
+    print(f"Wrote {count} responses to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Partial top-k selection shared by every ranking path
+
+The backend and the on-device recommenders ship separately, so this module is
+kept identical in android/yoga-backend-deploy/ and android/app/src/main/python/.
+"""
+
+import numpy as np
+
+
+def top_k(scores, k: int, threshold=None) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first
+    Ties are broken by ascending index, matching a stable sort in descending order
+    With a threshold, only scores strictly above it are considered
+
+    Uses argpartition plus a sort of the k winners, so the cost is O(n + k log k)
+    instead of a full O(n log n) sort of the catalog
+    """
+    scores = np.asarray(scores)
+    if k <= 0 or scores.size == 0:
+        return np.zeros(0, dtype=np.intp)
+
+    if threshold is not None:
+        candidates = np.flatnonzero(scores > threshold)
+        # Everything above the threshold fits: no selection needed
+        if len(candidates) <= k:
+            return candidates[np.argsort(-scores[candidates], kind="stable")]
+    else:
+        candidates = np.arange(scores.size)
+        if scores.size <= k:
+            return np.argsort(-scores, kind="stable")
+
+    values = scores[candidates]
+    kth = values[np.argpartition(-values, k - 1)[k - 1]]
+
+    # Keep every score above the kth, then fill with the lowest-index ties
+    above = np.flatnonzero(values > kth)
+    ties = np.flatnonzero(values == kth)[:k - len(above)]
+    winners = np.sort(np.concatenate([above, ties]))
+
+    return candidates[winners[np.argsort(-values[winners], kind="stable")]]
@@ -1,16 +1,29 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import List
-import pickle
-import numpy as np
+import asyncio
+import json
 import os
-import gc
 
-from sentence_transformers import SentenceTransformer
-import google.generativeai as genai
+import numpy as np
 from dotenv import load_dotenv
 from functools import lru_cache
 
+from answer_cache import SemanticAnswerCache
+from batching import MicroBatcher
+from embedding_cache import QueryEmbeddingCache, normalize_query
+from encoders import encoder_version, load_encoder
+from field_index import MultiFieldIndex
+from inference import InferenceExecutor, InferenceQueueFull
+from llm import LLMGateway, LLMUnavailable
+from memory import MemoryManager, ScoringBuffers
+from pose_store import open_store
+from ranking import top_k
+from response_cache import ResponseCache, canonical_profile, serialize_response
+from startup import ServiceNotReady, StartupTracker
+from vector_index import open_index
+
 # --------------------------------------------------
 # Environment and app setup
 # --------------------------------------------------
@@ -21,11 +34,50 @@ print("Starting Yoga Backend...")
 
 app = FastAPI(title="Yoga Backend", version="1.2")
 
-api_key = os.getenv("GOOGLE_API_KEY", "")
-if api_key:
-    genai.configure(api_key=api_key)
-else:
-    print("WARNING: GOOGLE_API_KEY not set")
+# Embeddings and the model load in the background after the server binds, see warm_up()
+startup = StartupTracker(["embeddings", "model"])
+
+@app.exception_handler(ServiceNotReady)
+async def service_not_ready(request: Request, exc: ServiceNotReady):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Server is starting ({exc.component} loading), please retry shortly."},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+# One pooled, rate-limited LLM gateway per worker (Gemini by default, see llm.py)
+llm = LLMGateway.from_env()
+
+# --------------------------------------------------
+# Inference executor (keeps encodes off the event loop)
+# --------------------------------------------------
+
+executor = InferenceExecutor.from_env()
+
+@app.exception_handler(InferenceQueueFull)
+async def inference_queue_full(request: Request, exc: InferenceQueueFull):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry shortly."},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+# Background, RSS-driven gc instead of a full collection per request
+memory_manager = MemoryManager.from_env()
+
+@app.on_event("startup")
+async def start_background_tasks():
+    memory_manager.start()
+    # Not awaited: the server starts accepting (and answering /livez) right away
+    app.state.warm_up_task = asyncio.get_running_loop().create_task(
+        startup.load_all({"embeddings": load_embeddings, "model": load_model})
+    )
+
+@app.on_event("shutdown")
+async def shutdown_executor():
+    memory_manager.stop()
+    executor.shutdown()
+    await llm.aclose()
 
 # --------------------------------------------------
 # Singleton model loader (prevents memory growth)
@@ -33,23 +85,137 @@ else:
 
 @lru_cache(maxsize=1)
 def get_model():
-    return SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+    # torch sentence-transformers or the exported ONNX model (ENCODER_BACKEND, see encoders.py)
+    return load_encoder()
+
+def encode_batch(texts):
+    return get_model().encode(texts)
+
+def load_model():
+    # A dummy encode pays for lazy initialisation before the first real query
+    encode_batch(["warm up"])
+
+# Concurrent query encodes are coalesced into one batched forward pass
+batcher = MicroBatcher.from_env(encode_batch, executor)
+
+# Shared by recommendations and chat retrieval; repeat queries skip the transformer
+query_cache = QueryEmbeddingCache.from_env()
+
+async def encode_query(text):
+    key = normalize_query(text)
+    query_emb = query_cache.get(key)
+    if query_emb is None:
+        query_emb = await batcher.encode(key)
+        query_cache.put(key, query_emb)
+    return query_emb
+
+def encode_query_sync(text):
+    key = normalize_query(text)
+    query_emb = query_cache.get(key)
+    if query_emb is None:
+        query_emb = get_model().encode([key])[0]
+        query_cache.put(key, query_emb)
+    return query_emb
 
 # --------------------------------------------------
-# Load embeddings ONCE (no pandas at runtime)
+# Load embeddings ONCE (memory-mapped, no pandas at runtime)
 # --------------------------------------------------
 
 PKL_PATH = os.path.join(os.path.dirname(__file__), "yoga_embeddings.pkl")
+STORE_PATH = os.getenv(
+    "POSE_STORE_PATH", os.path.join(os.path.dirname(__file__), "yoga_embeddings_store")
+)
+
+# Benefits search: exact (brute force, default) or an approximate index built offline,
+# see vector_index.py; it is rebuilt at load time if missing or built from other data.
+# Exact search can score an int8 copy and rescore the top candidates in float32
+INDEX_BACKEND = os.getenv("INDEX_BACKEND", "exact")
+EMBEDDING_PRECISION = os.getenv("EMBEDDING_PRECISION", "float32")
+INDEX_NAME = INDEX_BACKEND
+if INDEX_BACKEND == "exact" and EMBEDDING_PRECISION != "float32":
+    INDEX_NAME = f"exact-{EMBEDDING_PRECISION}"
+
+# "benefits": one query against Benefits_emb (default)
+# "weighted": the notebook's 4/4/4/2/2 score over Benefits, Targeted Physical and
+#             Targeted Mental Problems, with contraindicated poses excluded
+SCORING_MODE = os.getenv("SCORING_MODE", "benefits")
+if SCORING_MODE not in ("benefits", "weighted"):
+    raise ValueError(f"Unknown SCORING_MODE: {SCORING_MODE} (expected benefits or weighted)")
+
+# Cosine similarity above which a pose's contraindications match a user issue (same as on device)
+CONTRA_THRESHOLD = 0.25
+
+# Weights for chat retrieval, where one question is matched against every field
+CHAT_FIELD_WEIGHTS = {"Benefits_emb": 2, "Targeted Physical Problems_emb": 1, "Targeted Mental Problems_emb": 1}
+
+# Filled in by load_embeddings()
+store = None
+POSE_NAMES: List[str] = []
+BENEFITS: List[str] = []
+CONTRA: List[str] = []
+BENEFITS_EMB = None
+benefits_index = None
+field_index = None
+field_buffers = None
+CONTRA_TEXT = None
+response_cache = None
+answer_cache = None
+
+def load_embeddings():
+    global store, POSE_NAMES, BENEFITS, CONTRA, BENEFITS_EMB, benefits_index
+    global field_index, field_buffers, CONTRA_TEXT, response_cache, answer_cache
+
+    store = open_store(STORE_PATH, PKL_PATH)
+
+    POSE_NAMES = store.text("AName").tolist()
+    BENEFITS = store.text("Benefits").tolist()
+    CONTRA = store.text("Contraindications").tolist()
+    BENEFITS_EMB = store.embeddings("Benefits_emb")
+
+    print(f"Loaded {len(POSE_NAMES)} yoga poses")
+
+    benefits_index = open_index(
+        INDEX_BACKEND,
+        os.getenv("INDEX_PATH", os.path.join(STORE_PATH, f"Benefits_emb.{INDEX_NAME}")),
+        BENEFITS_EMB,
+        source=f"{store.version}:Benefits_emb",
+        precision=EMBEDDING_PRECISION,
+    )
 
-with open(PKL_PATH, "rb") as f:
-    df = pickle.load(f)
-
-POSE_NAMES = df["AName"].tolist()
-BENEFITS = df["Benefits"].tolist()
-CONTRA = df["Contraindications"].fillna("").tolist()
-BENEFITS_EMB = np.vstack(df["Benefits_emb"].values)
+    if SCORING_MODE == "weighted":
+        field_index = MultiFieldIndex({
+            name: store.embeddings(name)
+            for name in ("Benefits_emb", "Targeted Physical Problems_emb",
+                         "Targeted Mental Problems_emb", "Contraindications_emb")
+        })
+        field_buffers = ScoringBuffers(*field_index.matrix.shape)
+        CONTRA_TEXT = np.array([text.lower() for text in CONTRA], dtype=str)
+
+    # Whole /recommend/ responses, keyed by canonical profile, embeddings version, scoring mode,
+    # index and query encoder; precomputed files built for another of these are ignored
+    response_cache = ResponseCache.from_env(
+        f"{store.version}:{SCORING_MODE}:{INDEX_NAME}:{encoder_version()}",
+        os.path.join(os.path.dirname(__file__), "recommendation_cache.jsonl"),
+    )
 
-print(f"Loaded {len(POSE_NAMES)} yoga poses")
+    # Recent chat answers, reused for near-duplicate questions over the same poses
+    answer_cache = SemanticAnswerCache.from_env(BENEFITS_EMB.shape[1])
+
+def warm_up():
+    """Load every component now, on the calling thread (offline jobs)"""
+    startup.load("embeddings", load_embeddings)
+    startup.load("model", load_model)
+
+def preload():
+    """
+    Load what workers can share copy-on-write, in a pre-fork master (see gunicorn.conf.py)
+    The torch model's weights are loaded but not run: thread pools started by an
+    encode don't survive fork, so each worker does its own warm-up encode.
+    onnxruntime sessions start their thread pool on creation, so they load per worker
+    """
+    startup.load("embeddings", load_embeddings)
+    if os.getenv("ENCODER_BACKEND", "torch") == "torch":
+        get_model()
 
 # --------------------------------------------------
 # Request models
@@ -71,41 +237,123 @@ class ChatResponse(BaseModel):
     response: str
 
 # --------------------------------------------------
-# Recommendation logic (bounded + memory safe)
+# Recommendation logic (bounded, allocation-free scoring)
 # --------------------------------------------------
 
-def recommend_asanas(user_profile):
-    model = get_model()
-
-    query_text = " ".join(
+def build_query_text(user_profile):
+    # Callers pass a canonical_profile(), so term order never changes the ranking
+    return " ".join(
         user_profile["goals"]
         + user_profile["physical_issues"]
         + user_profile["mental_issues"]
     )
 
-    query_emb = model.encode(query_text, normalize_embeddings=True)
-    sims = np.dot(BENEFITS_EMB, query_emb)
+def profile_queries(user_profile) -> List[str]:
+    """
+    Texts to encode for a canonical profile, in the order rank_profile expects
+    weighted mode: goals, physical issues, mental issues, then each issue for the contraindication check
+    """
+    if SCORING_MODE == "benefits":
+        return [build_query_text(user_profile)]
+    issues = list(dict.fromkeys(user_profile["physical_issues"] + user_profile["mental_issues"]))
+    return [
+        " ".join(user_profile["goals"]),
+        " ".join(user_profile["physical_issues"]),
+        " ".join(user_profile["mental_issues"]),
+    ] + issues
+
+def contraindicated(issues, issue_embs) -> np.ndarray:
+    """Poses whose contraindications mention an issue literally or match it semantically"""
+    discard = np.zeros(len(POSE_NAMES), dtype=bool)
+    for issue in issues:
+        discard |= np.char.find(CONTRA_TEXT, issue) >= 0
+    if issues:
+        discard |= field_index.mask_similar("Contraindications_emb", np.vstack(issue_embs), CONTRA_THRESHOLD)
+    return discard
+
+def rounded_top_k(ids, scores, k: int = 10):
+    """
+    The on-device ranking rule (YogaRecommender): best k by score rounded to
+    the 3 decimals returned, ties in pose order; scores come back rounded
+    """
+    by_id = np.argsort(ids, kind="stable")
+    ids = np.asarray(ids)[by_id]
+    rounded = np.array([round(float(score), 3) for score in np.asarray(scores)[by_id]])
+    best = top_k(rounded, k)
+    return ids[best], rounded[best]
+
+def format_results(ids, scores):
+    return [
+        {
+            "name": POSE_NAMES[i],
+            "score": round(float(score), 3),
+            "benefits": BENEFITS[i],
+            "contraindications": CONTRA[i]
+        }
+        for i, score in zip(ids, scores)
+    ]
+
+def rank_asanas(query_emb, k: int = 10):
+    # Poses just below the kth can tie with it once rounded: fetch more until one can't
+    fetch = 2 * k
+    while True:
+        ids, scores = benefits_index.search(query_emb, fetch, threshold=0)
+        if len(ids) < fetch or round(float(scores[-1]), 3) < round(float(scores[k - 1]), 3):
+            break
+        fetch *= 2
+    results = format_results(*rounded_top_k(ids, scores, k))
+
+    memory_manager.after_request()
+
+    return results
 
-    top_idx = np.argsort(sims)[::-1][:10]
+def rank_weighted(goals_emb, physical_emb, mental_emb, issues, issue_embs):
+    # One GEMV over [Benefits | Targeted Physical | Targeted Mental | Contraindications]
+    query = field_index.query_vector([
+        ("Benefits_emb", 4, goals_emb),
+        ("Benefits_emb", 4, physical_emb),
+        ("Benefits_emb", 4, mental_emb),
+        ("Targeted Physical Problems_emb", 2, physical_emb),
+        ("Targeted Mental Problems_emb", 2, mental_emb),
+    ])
+    scores = field_buffers.similarity(field_index.matrix, query)
+    scores[contraindicated(issues, issue_embs)] = -np.inf
 
-    results = []
-    for i in top_idx:
-        if sims[i] > 0:
-            results.append({
-                "name": POSE_NAMES[i],
-                "score": round(float(sims[i]), 3),
-                "benefits": BENEFITS[i],
-                "contraindications": CONTRA[i]
-            })
+    candidates = np.flatnonzero(scores > 0)
+    results = format_results(*rounded_top_k(candidates, scores[candidates]))
 
-    del query_emb, sims
-    gc.collect()
+    memory_manager.after_request()
 
     return results
 
+def rank_profile(user_profile, query_embs):
+    """Top 10 poses for a canonical profile, given the embeddings of profile_queries()"""
+    if SCORING_MODE == "benefits":
+        return rank_asanas(query_embs[0])
+    issues = profile_queries(user_profile)[3:]
+    return rank_weighted(query_embs[0], query_embs[1], query_embs[2], issues, query_embs[3:])
+
+def recommend_asanas(user_profile):
+    profile = canonical_profile(user_profile)
+    return rank_profile(profile, [encode_query_sync(text) for text in profile_queries(profile)])
+
 @app.post("/recommend/")
 async def get_recommendations(user_input: UserInput):
-    return {"recommended_asanas": recommend_asanas(user_input.dict())}
+    startup.require("embeddings")
+    profile = canonical_profile(user_input.dict())
+    key = response_cache.key(profile)
+
+    body = response_cache.get(key)
+    if body is None:
+        # Precomputed and cached answers are served while the model is still loading
+        startup.require("model")
+        # Concurrent encodes land in the same micro-batch
+        query_embs = await asyncio.gather(*(encode_query(text) for text in profile_queries(profile)))
+        results = await executor.run(rank_profile, profile, query_embs)
+        body = serialize_response({"recommended_asanas": results})
+        response_cache.put(key, body)
+
+    return Response(content=body, media_type="application/json")
 
 # --------------------------------------------------
 # Conversational RAG architecture
@@ -128,33 +376,43 @@ Rules:
 - Keep responses concise and helpful (3–6 sentences).
 """
 
-def retrieve_context(query: str, k: int = 5) -> str:
-    model = get_model()
-
-    query_emb = model.encode(query, normalize_embeddings=True)
-    sims = np.dot(BENEFITS_EMB, query_emb)
-
-    top_idx = np.argsort(sims)[::-1][:k]
+def retrieve_poses(query_emb, k: int = 5) -> List[int]:
+    if SCORING_MODE == "weighted":
+        query = field_index.query_vector([(name, w, query_emb) for name, w in CHAT_FIELD_WEIGHTS.items()])
+        sims = field_buffers.similarity(field_index.matrix, query)
+        return top_k(sims, k, threshold=0.15).tolist()
+    return benefits_index.search(query_emb, k, threshold=0.15)[0].tolist()
 
+def format_context(poses: List[int]) -> str:
     context_blocks = []
-    for i in top_idx:
-        if sims[i] > 0.15:
-            context_blocks.append(
-                f"Pose: {POSE_NAMES[i]}\n"
-                f"Benefits: {BENEFITS[i]}\n"
-                f"Contraindications: {CONTRA[i]}"
-            )
-
-    del query_emb, sims
+    for i in poses:
+        context_blocks.append(
+            f"Pose: {POSE_NAMES[i]}\n"
+            f"Benefits: {BENEFITS[i]}\n"
+            f"Contraindications: {CONTRA[i]}"
+        )
+
     return "\n\n".join(context_blocks)
 
-@app.post("/chat/", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    try:
-        query = request.message.strip()
-        context = retrieve_context(query)
+def build_context(query_emb, k: int = 5) -> str:
+    return format_context(retrieve_poses(query_emb, k))
+
+def retrieve_context(query: str, k: int = 5) -> str:
+    return build_context(encode_query_sync(query), k)
+
+CHAT_ERROR_MESSAGE = "I ran into an issue while answering. Please try again."
 
-        prompt = f"""
+def retrieval_only_answer(poses: List[int]) -> str:
+    """Answer from the retrieved poses alone, used while the LLM is unavailable"""
+    if not poses:
+        return CHAT_ERROR_MESSAGE
+    lines = ["I can't reach the assistant right now, but these poses from our library look relevant:"]
+    for i in poses[:3]:
+        lines.append(f"- {POSE_NAMES[i]}: {BENEFITS[i]} (Avoid if: {CONTRA[i]})")
+    return "\n".join(lines)
+
+def build_prompt(query: str, context: str) -> str:
+    return f"""
 {SYSTEM_PROMPT}
 
 Yoga Knowledge (may be empty):
@@ -164,28 +422,135 @@ User: {query}
 Instructor:
 """
 
-        response = genai.GenerativeModel(
-            "gemini-2.0-flash"
-        ).generate_content(prompt)
-
-        gc.collect()
+async def prepare_prompt(request: ChatRequest):
+    """The query embedding, the retrieved pose indices and the LLM prompt built from them"""
+    query = request.message.strip()
+    query_emb = await encode_query(query)
+    poses = await executor.run(retrieve_poses, query_emb)
+    return query_emb, poses, build_prompt(query, format_context(poses))
 
-        return ChatResponse(response=response.text)
+@app.post("/chat/", response_model=ChatResponse)
+async def chat(request: ChatRequest):
+    startup.require("embeddings", "model")
+    try:
+        query_emb, poses, prompt = await prepare_prompt(request)
+        response = answer_cache.get(query_emb, poses)
+        if response is None:
+            try:
+                response = await llm.generate(prompt)
+            except LLMUnavailable as e:
+                print(f"LLM unavailable, answering from retrieval: {e}")
+                response = retrieval_only_answer(poses)
+            else:
+                # A blocked or candidate-less generation comes back empty; never cache that
+                if response.strip():
+                    answer_cache.put(query_emb, poses, response)
+                else:
+                    print("LLM returned an empty answer, answering from retrieval")
+                    response = retrieval_only_answer(poses)
+
+        memory_manager.after_request()
+
+        return ChatResponse(response=response)
+
+    except InferenceQueueFull:
+        raise
 
     except Exception as e:
         print(f"Chat error: {e}")
-        return ChatResponse(
-            response="I ran into an issue while answering. Please try again."
-        )
+        return ChatResponse(response=CHAT_ERROR_MESSAGE)
+
+def sse_event(payload: dict) -> str:
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Same answer as /chat/, sent as server-sent events while it is generated:
+    data: {"delta": "..."} per chunk, then data: {"done": true}
+    or data: {"error": "..."} if generation fails part-way
+    """
+    startup.require("embeddings", "model")
+    query_emb, poses, prompt = await prepare_prompt(request)
+    cached = answer_cache.get(query_emb, poses)
+
+    async def events():
+        if cached is not None:
+            yield sse_event({"delta": cached})
+            yield sse_event({"done": True})
+            memory_manager.after_request()
+            return
+
+        sent = []
+        try:
+            async for delta in llm.stream(prompt):
+                if not delta:
+                    continue
+                sent.append(delta)
+                yield sse_event({"delta": delta})
+            answer = "".join(sent)
+            if answer.strip():
+                answer_cache.put(query_emb, poses, answer)
+            else:
+                print("LLM streamed an empty answer, answering from retrieval")
+                yield sse_event({"delta": retrieval_only_answer(poses)})
+            yield sse_event({"done": True})
+        except LLMUnavailable as e:
+            print(f"LLM unavailable during stream: {e}")
+            # Nothing sent yet: the retrieval-only answer is still a whole answer
+            if sent:
+                yield sse_event({"error": CHAT_ERROR_MESSAGE})
+            else:
+                yield sse_event({"delta": retrieval_only_answer(poses)})
+                yield sse_event({"done": True})
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            yield sse_event({"error": CHAT_ERROR_MESSAGE})
+        finally:
+            memory_manager.after_request()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # --------------------------------------------------
-# Health endpoint
+# Health endpoints
 # --------------------------------------------------
 
+@app.get("/livez")
+async def livez():
+    """The process is up and its event loop responds; says nothing about loaded data"""
+    return {"status": "alive", "uptime_s": startup.stats()["uptime_s"]}
+
+@app.get("/readyz")
+async def readyz():
+    """200 once every component has loaded, 503 before; includes per-component load times"""
+    stats = startup.stats()
+    return JSONResponse(status_code=200 if stats["ready"] else 503, content=stats)
+
 @app.get("/health")
 async def health():
     return {
-        "status": "ok",
+        "status": "ok" if startup.is_ready() else "starting",
         "poses_loaded": len(POSE_NAMES),
-        "model_loaded": True
+        "model_loaded": startup.is_ready("model"),
+        "llm_backend": llm.name,
+        "startup": startup.stats()["components"],
+        "query_cache": query_cache.stats(),
+        "response_cache": response_cache.stats() if response_cache else None,
+        "answer_cache": answer_cache.stats() if answer_cache else None
+    }
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "inference": executor.stats(),
+        "batching": batcher.stats(),
+        "query_cache": query_cache.stats(),
+        "response_cache": response_cache.stats() if response_cache else None,
+        "answer_cache": answer_cache.stats() if answer_cache else None,
+        "memory": memory_manager.stats(),
+        "llm": llm.stats()
     }
@@ -0,0 +1,141 @@
+"""
+Full-response cache for /recommend/
+
+The ranking depends only on the goals, physical_issues and mental_issues of a
+profile (order and case don't matter once canonicalized) and on the embeddings
+version. Responses are cached as pre-serialized JSON bytes under a hash of
+those inputs, so a hit is served without encoding or sorting anything.
+
+precompute_responses.py fills a JSONL file with answers for every
+combination of the onboarding options; it is loaded at startup and pinned.
+
+Configured from the environment:
+    RESPONSE_CACHE_MAX_ENTRIES   LRU capacity for computed responses (default 4096)
+    RESPONSE_CACHE_PATH          precomputed JSONL file (default recommendation_cache.jsonl)
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def _canonical_list(values: List[str]) -> List[str]:
+    return sorted({" ".join(v.lower().split()) for v in values} - {""})
+
+
+def canonical_profile(user_profile: Dict) -> Dict:
+    """The parts of a profile that affect the ranking, in a canonical form"""
+    return {
+        "goals": _canonical_list(user_profile.get("goals", [])),
+        "physical_issues": _canonical_list(user_profile.get("physical_issues", [])),
+        "mental_issues": _canonical_list(user_profile.get("mental_issues", [])),
+    }
+
+
+def profile_key(profile: Dict, version: str) -> str:
+    """Hash of a canonical profile and the data/scoring version"""
+    payload = json.dumps(
+        [version, profile["goals"], profile["physical_issues"], profile["mental_issues"]],
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def serialize_response(content) -> bytes:
+    """Same encoding FastAPI's JSONResponse uses"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class ResponseCache:
+    def __init__(self, version: str, max_entries: int = 4096):
+        self.version = version
+        self.max_entries = max_entries
+
+        # Precomputed answers are pinned; computed ones live in the LRU
+        self._pinned: Dict[str, bytes] = {}
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls, version: str, default_path: str) -> "ResponseCache":
+        cache = cls(version, max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "4096")))
+        path = os.getenv("RESPONSE_CACHE_PATH", default_path)
+        if os.path.exists(path):
+            cache.load_precomputed(path)
+        return cache
+
+    def key(self, profile: Dict) -> str:
+        return profile_key(profile, self.version)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._pinned.get(key)
+            if body is None:
+                body = self._entries.get(key)
+                if body is not None:
+                    self._entries.move_to_end(key)
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return body
+
+    def put(self, key: str, body: bytes):
+        with self._lock:
+            if key in self._pinned:
+                return
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def load_precomputed(self, path: str) -> int:
+        """Load a file written by write_precomputed; skipped if it was built for another version"""
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != self.version:
+                print(f"Ignoring {path}: built for version {header.get('version')}, serving {self.version}")
+                return 0
+            pinned = {}
+            for line in f:
+                entry = json.loads(line)
+                pinned[entry["key"]] = entry["body"].encode("utf-8")
+
+        with self._lock:
+            self._pinned = pinned
+        print(f"Loaded {len(pinned)} precomputed recommendation responses")
+        return len(pinned)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version,
+            "precomputed": len(self._pinned),
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+def write_precomputed(path: str, version: str, entries: Iterable[Tuple[str, bytes]]) -> int:
+    """Write (key, body) pairs as JSONL with a version header line"""
+    count = 0
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"version": version}) + "\n")
+        for key, body in entries:
+            f.write(json.dumps({"key": key, "body": body.decode("utf-8")}, ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
@@ -0,0 +1,70 @@
+"""
+Staged startup tracking
+
+The server binds before the heavy components are loaded; each component is
+loaded once, in order, from a background task (or up front by offline jobs),
+and its status and load time are recorded for /readyz and /health.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class ServiceNotReady(Exception):
+    def __init__(self, component: str, retry_after: int = 5):
+        super().__init__(f"{component} is still loading")
+        self.component = component
+        self.retry_after = retry_after
+
+
+class StartupTracker:
+    def __init__(self, components: List[str]):
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.components: Dict[str, Dict] = {
+            name: {"status": "pending", "seconds": None, "error": None} for name in components
+        }
+
+    def load(self, name: str, loader: Callable[[], None]):
+        """Run a component's loader once, recording its status and duration; re-raises failures"""
+        with self._lock:
+            component = self.components[name]
+            if component["status"] == "ready":
+                return
+            component["status"] = "loading"
+            started = time.perf_counter()
+            try:
+                loader()
+            except Exception as e:
+                component.update(status="failed", error=repr(e), seconds=round(time.perf_counter() - started, 3))
+                raise
+            component.update(status="ready", error=None, seconds=round(time.perf_counter() - started, 3))
+        print(f"Loaded {name} in {component['seconds']:.2f}s")
+
+    async def load_all(self, loaders: Dict[str, Callable[[], None]]):
+        """Load components in order on a worker thread, keeping the event loop free; stops at the first failure"""
+        for name, loader in loaders.items():
+            try:
+                await asyncio.to_thread(self.load, name, loader)
+            except Exception as e:
+                print(f"Startup failed while loading {name}: {e!r}")
+                return
+
+    def is_ready(self, name: Optional[str] = None) -> bool:
+        if name is not None:
+            return self.components[name]["status"] == "ready"
+        return all(c["status"] == "ready" for c in self.components.values())
+
+    def require(self, *names: str):
+        for name in names:
+            if not self.is_ready(name):
+                raise ServiceNotReady(name)
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.is_ready(),
+            "uptime_s": round(time.monotonic() - self.started_at, 3),
+            "components": {name: dict(c) for name, c in self.components.items()},
+        }
@@ -0,0 +1,30 @@
+"""Semantic answer cache entries"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answer_cache import SemanticAnswerCache  # noqa: E402
+
+
+def unit(seed: int, dim: int = 8) -> np.ndarray:
+    vector = np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_similar_question_reuses_answer():
+    cache = SemanticAnswerCache(dim=8)
+    cache.put(unit(0), [1, 2, 3], "Try Bhujangasana.")
+    assert cache.get(unit(0), [3, 2, 1]) == "Try Bhujangasana."
+    assert cache.get(unit(0), [1, 2]) is None
+
+
+def test_empty_answer_is_not_cached():
+    cache = SemanticAnswerCache(dim=8)
+    cache.put(unit(0), [1, 2, 3], "")
+    cache.put(unit(0), [1, 2, 3], "  \n")
+    assert cache.get(unit(0), [1, 2, 3]) is None
+    assert cache.stats()["entries"] == 0
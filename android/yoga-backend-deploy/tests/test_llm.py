@@ -0,0 +1,136 @@
+"""Circuit breaker behaviour of the LLM gateway"""
+
+import asyncio
+import os
+import sys
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm import CircuitBreaker, FakeProvider, LLMGateway, LLMProvider, LLMUnavailable  # noqa: E402
+
+
+class SlowProvider(LLMProvider):
+    """Answers one chunk at a time, each after `delay` seconds"""
+
+    name = "slow"
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def stream(self, prompt: str):
+        for word in ("one ", "two ", "three"):
+            await asyncio.sleep(self.delay)
+            yield word
+
+
+class OneShotProvider(LLMProvider):
+    name = "one-shot"
+
+    async def generate(self, prompt: str) -> str:
+        return "answer"
+
+
+class StatusProvider(LLMProvider):
+    """Fails with the next HTTP status of `statuses` on every call"""
+
+    name = "status"
+
+    def __init__(self, statuses):
+        self.statuses = iter(statuses)
+
+    async def generate(self, prompt: str) -> str:
+        request = httpx.Request("POST", "https://llm.test")
+        response = httpx.Response(next(self.statuses), request=request)
+        raise httpx.HTTPStatusError("failed", request=request, response=response)
+
+
+def half_open_gateway(provider: LLMProvider) -> LLMGateway:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.state == "half-open"
+    return LLMGateway(provider, timeout_s=5.0, retries=0, breaker=breaker)
+
+
+def test_cancelled_generate_trial_releases_breaker():
+    async def run():
+        gateway = half_open_gateway(SlowProvider(delay=0.05))
+        task = asyncio.ensure_future(gateway.generate("hi"))
+        await asyncio.sleep(0.01)
+        assert gateway.breaker.trial_in_flight
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not gateway.breaker.trial_in_flight
+        assert await gateway.generate("hi") == "one two three"
+        assert gateway.breaker.state == "closed"
+
+    asyncio.run(run())
+
+
+def test_abandoned_stream_trial_releases_breaker():
+    async def run():
+        gateway = half_open_gateway(SlowProvider(delay=0.0))
+        chunks = gateway.stream("hi")
+        assert await chunks.__anext__() == "one "
+        # The SSE consumer goes away mid-stream (GeneratorExit inside the gateway)
+        await chunks.aclose()
+        assert not gateway.breaker.trial_in_flight
+        assert [delta async for delta in gateway.stream("hi")] == ["one ", "two ", "three"]
+        assert gateway.breaker.state == "closed"
+
+    asyncio.run(run())
+
+
+def test_second_call_is_rejected_while_trial_runs():
+    async def run():
+        gateway = half_open_gateway(SlowProvider(delay=0.05))
+        trial = asyncio.ensure_future(gateway.generate("hi"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(LLMUnavailable):
+            await gateway.generate("hi")
+        assert await trial == "one two three"
+
+    asyncio.run(run())
+
+
+def test_provider_without_streaming_streams_one_chunk():
+    async def run():
+        gateway = LLMGateway(OneShotProvider())
+        assert [delta async for delta in gateway.stream("hi")] == ["answer"]
+        assert await LLMGateway(FakeProvider()).generate("hi")
+
+    asyncio.run(run())
+
+
+def test_provider_must_implement_generate_or_stream():
+    with pytest.raises(TypeError):
+        class Incomplete(LLMProvider):
+            name = "incomplete"
+
+
+def test_auth_errors_open_breaker():
+    async def run():
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60.0)
+        gateway = LLMGateway(StatusProvider([401, 403, 401]), retries=0, breaker=breaker)
+        for _ in range(3):
+            with pytest.raises(LLMUnavailable):
+                await gateway.generate("hi")
+        assert breaker.state == "open"
+
+    asyncio.run(run())
+
+
+def test_bad_requests_do_not_reset_failure_count():
+    async def run():
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60.0)
+        gateway = LLMGateway(StatusProvider([500, 400, 500, 400, 500]), retries=0, breaker=breaker)
+        for _ in range(5):
+            with pytest.raises(LLMUnavailable):
+                await gateway.generate("hi")
+        assert breaker.failures == 3
+        assert breaker.state == "open"
+
+    asyncio.run(run())
@@ -0,0 +1,507 @@
+"""
+Vector indexes for similarity search over an embedding column
+
+Every backend answers search(query, k, threshold) with the ids and inner
+products of the best matches, best first. Embeddings are unit-normalized, so
+inner product is cosine similarity.
+
+    exact   brute-force matrix-vector product (the default; exact results)
+    ivf     inverted file: spherical k-means partitions the vectors, a query
+            scores only the nprobe lists whose centroids are closest
+    ivfpq   ivf with product-quantized codes (uint8 per subspace); candidates
+            are ranked by table lookups and the best refine * k are rescored
+            against the full vectors
+    hnsw    graph index from the optional hnswlib package
+
+Exact search can also run on an int8 copy of the vectors with one float32
+scale per row, which is 4x smaller to keep resident. The quantized scores
+pick rescore * k candidates, which are rescored against the float32 vectors,
+so the results and their scores are those of float32 search unless a true
+top-k row falls outside the candidates. Codes are upcast to float32 a block
+at a time for BLAS, which trades some latency for the memory while the
+float32 matrix is small (see benchmark_index.py); float16 codes are not
+offered, numpy upcasts them too slowly.
+
+Indexes are built offline into a directory of .npy files plus a manifest and
+memory-mapped at startup, so workers share their pages:
+
+    python vector_index.py yoga_embeddings_store Benefits_emb --kind ivfpq --out yoga_embeddings_store/Benefits_emb.ivfpq
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from memory import ScoringBuffers
+from pose_store import build_lock, publish_directory
+from ranking import top_k
+
+INDEX_FORMAT = "yoga-vector-index"
+INDEX_VERSION = 1
+INDEX_KINDS = ("exact", "ivf", "ivfpq", "hnsw")
+PRECISIONS = ("float32", "int8")
+
+# Rows scored at a time during k-means, bounding the (rows x lists) temporary
+ASSIGN_CHUNK = 8192
+
+# Quantized rows upcast to float32 at a time, so scoring stays on float32 BLAS
+SCORE_CHUNK = 1024
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _kmeans(data: np.ndarray, n_clusters: int, iterations: int, rng, spherical: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lloyd's k-means; spherical assigns by inner product and keeps unit centroids
+    Returns (centroids, assignment)
+    """
+    n_clusters = min(n_clusters, len(data))
+    centroids = data[rng.choice(len(data), n_clusters, replace=False)].copy()
+    assignment = np.zeros(len(data), dtype=np.int64)
+
+    for _ in range(iterations):
+        for start in range(0, len(data), ASSIGN_CHUNK):
+            chunk = data[start:start + ASSIGN_CHUNK]
+            if spherical:
+                assignment[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+            else:
+                # argmin |x - c|^2 = argmin |c|^2 - 2 x.c
+                dists = (centroids ** 2).sum(axis=1) - 2 * chunk @ centroids.T
+                assignment[start:start + len(chunk)] = np.argmin(dists, axis=1)
+
+        counts = np.bincount(assignment, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, data)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Reseed empty clusters from random points
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+        if spherical:
+            centroids = _normalize(centroids)
+
+    return centroids, assignment
+
+
+class VectorIndex(ABC):
+    """Interface shared by every backend; a backend missing part of it fails when instantiated"""
+
+    kind = "base"
+
+    @classmethod
+    @abstractmethod
+    def build(cls, vectors: np.ndarray, **params) -> "VectorIndex":
+        """Index unit-normalized (or normalizable) vectors"""
+
+    @classmethod
+    @abstractmethod
+    def load(cls, path: str, params: Dict, vectors=None) -> "VectorIndex":
+        """Open an index directory written by save_index"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abstractmethod
+    def search(self, query: np.ndarray, k: int, threshold: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, scores) of the k best matches, best first; with a threshold, only scores above it"""
+
+    @abstractmethod
+    def save_arrays(self, out_dir: str):
+        """Write the index's arrays into out_dir (the manifest is written by save_index)"""
+
+    def params(self) -> Dict:
+        return {}
+
+
+class ExactIndex(VectorIndex):
+    kind = "exact"
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+        self.buffers = ScoringBuffers(*vectors.shape)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, **_) -> "ExactIndex":
+        return cls(_normalize(vectors))
+
+    @classmethod
+    def load(cls, path: str, params: Dict, vectors=None) -> "ExactIndex":
+        return cls(np.load(os.path.join(path, "vectors.npy"), mmap_mode="r"))
+
+    def save_arrays(self, out_dir: str):
+        np.save(os.path.join(out_dir, "vectors.npy"), self.vectors)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def search(self, query, k, threshold=None):
+        scores = self.buffers.similarity(self.vectors, query)
+        ids = top_k(scores, k, threshold=threshold)
+        return ids, scores[ids]
+
+
+class _ChunkBuffers(threading.local):
+    """Per-thread upcast block, query and score buffers for QuantizedIndex"""
+
+    def __init__(self, num_rows: int, dim: int):
+        self.block = np.empty((min(SCORE_CHUNK, num_rows), dim), dtype=np.float32)
+        self.query = np.empty(dim, dtype=np.float32)
+        self.scores = np.empty(num_rows, dtype=np.float32)
+
+
+class QuantizedIndex(VectorIndex):
+    """
+    Exact search over per-row-scaled int8 codes, rescored in float32
+    The float32 vectors are only read for the candidates, so when they are
+    memory-mapped most of their pages never become resident
+    """
+
+    kind = "quantized"
+
+    def __init__(self, codes, scales, vectors, rescore: int = 4):
+        self.codes = codes
+        self.scales = scales
+        self.vectors = vectors
+        self.rescore = rescore
+        self.buffers = _ChunkBuffers(*codes.shape)
+
+    @classmethod
+    def build(cls, vectors, precision: str = "int8", rescore: int = 4, **_) -> "QuantizedIndex":
+        if precision != "int8":
+            raise ValueError(f"Unsupported precision: {precision} (expected int8)")
+        matrix = np.asarray(vectors, dtype=np.float32)
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.rint(matrix / scales[:, None]).astype(np.int8)
+        return cls(codes, scales.astype(np.float32), vectors, rescore)
+
+    @classmethod
+    def load(cls, path: str, params: Dict, vectors=None) -> "QuantizedIndex":
+        if vectors is None:
+            raise ValueError("A quantized index needs the float32 vectors for rescoring")
+        if params.get("precision") != "int8":
+            raise ValueError(f"Unsupported precision: {params.get('precision')} (expected int8)")
+        return cls(
+            np.load(os.path.join(path, "codes.npy"), mmap_mode="r"),
+            np.load(os.path.join(path, "scales.npy"), mmap_mode="r"),
+            vectors,
+            params["rescore"],
+        )
+
+    def save_arrays(self, out_dir: str):
+        np.save(os.path.join(out_dir, "codes.npy"), self.codes)
+        np.save(os.path.join(out_dir, "scales.npy"), self.scales)
+
+    def params(self) -> Dict:
+        return {"precision": "int8", "rescore": self.rescore}
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def approximate_scores(self, query) -> np.ndarray:
+        """Quantized scores for every row, in a buffer valid until this thread's next call"""
+        buffers = self.buffers
+        np.copyto(buffers.query, query, casting="same_kind")
+        for start in range(0, len(self.codes), SCORE_CHUNK):
+            stop = min(start + SCORE_CHUNK, len(self.codes))
+            block = buffers.block[:stop - start]
+            np.copyto(block, self.codes[start:stop], casting="unsafe")
+            np.matmul(block, buffers.query, out=buffers.scores[start:stop])
+        buffers.scores *= self.scales
+        return buffers.scores
+
+    def search(self, query, k, threshold=None):
+        query = np.asarray(query, dtype=np.float32)
+        approx = self.approximate_scores(query)
+        # Candidates in id order, so ties resolve like ExactIndex
+        candidates = np.sort(top_k(approx, k * self.rescore))
+        scores = np.asarray(self.vectors[candidates], dtype=np.float32) @ query
+        best = top_k(scores, k, threshold=threshold)
+        return candidates[best], scores[best]
+
+
+class IVFIndex(VectorIndex):
+    """
+    Vectors are stored grouped by list, so each probed list is one contiguous
+    slice of the memory-mapped matrix; ids maps positions back to original rows
+    With pq_m > 0, uint8 codes of each vector's residual from its list centroid,
+    over pq_m subspaces, are stored as well
+    """
+
+    kind = "ivf"
+
+    def __init__(self, centroids, offsets, ids, vectors, nprobe=8, codebooks=None, codes=None, refine=10):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+        self.vectors = vectors
+        self.nprobe = nprobe
+        self.codebooks = codebooks
+        self.codes = codes
+        self.refine = refine
+        if codebooks is not None:
+            self.kind = "ivfpq"
+
+    @classmethod
+    def build(cls, vectors, nlist: int = 0, nprobe: int = 8, pq_m: int = 0, refine: int = 10,
+              iterations: int = 20, seed: int = 0, **_) -> "IVFIndex":
+        vectors = _normalize(vectors)
+        rng = np.random.default_rng(seed)
+        if not nlist:
+            nlist = max(1, int(4 * np.sqrt(len(vectors))))
+
+        centroids, assignment = _kmeans(vectors, nlist, iterations, rng, spherical=True)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=len(centroids))
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        grouped = np.ascontiguousarray(vectors[order])
+
+        codebooks = codes = None
+        if pq_m:
+            dim = vectors.shape[1]
+            if dim % pq_m:
+                raise ValueError(f"pq_m={pq_m} must divide the dimension {dim}")
+            sub = dim // pq_m
+            codebooks = np.empty((pq_m, min(256, len(vectors)), sub), dtype=np.float32)
+            codes = np.empty((len(vectors), pq_m), dtype=np.uint8)
+            # Codes quantize the residual from the list centroid, which is much smaller than the vector
+            residuals = grouped - centroids[assignment[order]]
+            for m in range(pq_m):
+                part = np.ascontiguousarray(residuals[:, m * sub:(m + 1) * sub])
+                codebooks[m], codes[:, m] = _kmeans(part, codebooks.shape[1], iterations, rng, spherical=False)
+
+        return cls(centroids, offsets, order.astype(np.int64), grouped, nprobe, codebooks, codes, refine)
+
+    @classmethod
+    def load(cls, path: str, params: Dict, vectors=None) -> "IVFIndex":
+        def array(name):
+            file = os.path.join(path, f"{name}.npy")
+            return np.load(file, mmap_mode="r") if os.path.exists(file) else None
+
+        return cls(
+            array("centroids"), array("offsets"), array("ids"), array("vectors"),
+            nprobe=params["nprobe"], codebooks=array("codebooks"), codes=array("codes"),
+            refine=params.get("refine", 10),
+        )
+
+    def save_arrays(self, out_dir: str):
+        for name in ("centroids", "offsets", "ids", "vectors", "codebooks", "codes"):
+            array = getattr(self, name)
+            if array is not None:
+                np.save(os.path.join(out_dir, f"{name}.npy"), array)
+
+    def params(self) -> Dict:
+        params = {"nlist": len(self.centroids), "nprobe": self.nprobe}
+        if self.codebooks is not None:
+            params.update(pq_m=len(self.codebooks), refine=self.refine)
+        return params
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query, k, threshold=None):
+        query = np.asarray(query, dtype=np.float32)
+        centroid_scores = self.centroids @ query
+        probe = top_k(centroid_scores, self.nprobe)
+        ranges = [np.arange(self.offsets[p], self.offsets[p + 1]) for p in probe]
+        positions = np.concatenate(ranges) if ranges else np.zeros(0, dtype=np.int64)
+
+        if self.codebooks is not None and len(positions) > k * self.refine:
+            # Asymmetric distance: q.x ~ q.centroid + sum of per-subspace lookups of q.codeword
+            m, _, sub = self.codebooks.shape
+            tables = np.einsum("mcd,md->mc", self.codebooks, query.reshape(m, sub))
+            approx = tables[np.arange(m), self.codes[positions]].sum(axis=1)
+            approx += np.repeat(centroid_scores[probe], [len(r) for r in ranges])
+            positions = positions[top_k(approx, k * self.refine)]
+
+        # Exact scores for the candidates; order candidates by id so ties resolve like ExactIndex
+        positions = positions[np.argsort(self.ids[positions], kind="stable")]
+        scores = self.vectors[positions] @ query
+        best = top_k(scores, k, threshold=threshold)
+        return self.ids[positions[best]], scores[best]
+
+
+class HNSWIndex(VectorIndex):
+    """hnswlib graph; its file is read into memory rather than memory-mapped"""
+
+    kind = "hnsw"
+
+    def __init__(self, index, ef: int = 64):
+        self.index = index
+        self.ef = ef
+        self.index.set_ef(ef)
+
+    @staticmethod
+    def _hnswlib():
+        try:
+            import hnswlib
+        except ImportError:
+            raise ImportError("The hnsw index backend needs the hnswlib package (pip install hnswlib)")
+        return hnswlib
+
+    @classmethod
+    def build(cls, vectors, M: int = 16, ef_construction: int = 200, ef: int = 64, seed: int = 0, **_) -> "HNSWIndex":
+        hnswlib = cls._hnswlib()
+        vectors = _normalize(vectors)
+        index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        index.init_index(max_elements=len(vectors), M=M, ef_construction=ef_construction, random_seed=seed)
+        index.add_items(vectors, np.arange(len(vectors)))
+        return cls(index, ef)
+
+    @classmethod
+    def load(cls, path: str, params: Dict, vectors=None) -> "HNSWIndex":
+        hnswlib = cls._hnswlib()
+        index = hnswlib.Index(space="ip", dim=params["dim"])
+        index.load_index(os.path.join(path, "graph.bin"))
+        return cls(index, params["ef"])
+
+    def save_arrays(self, out_dir: str):
+        self.index.save_index(os.path.join(out_dir, "graph.bin"))
+
+    def params(self) -> Dict:
+        return {"ef": self.ef, "dim": self.index.dim}
+
+    def __len__(self) -> int:
+        return self.index.get_current_count()
+
+    def search(self, query, k, threshold=None):
+        k = min(k, len(self))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        labels, distances = self.index.knn_query(np.asarray(query, dtype=np.float32), k=k)
+        ids, scores = labels[0].astype(np.int64), 1.0 - distances[0]
+        if threshold is not None:
+            keep = scores > threshold
+            ids, scores = ids[keep], scores[keep]
+        return ids, scores
+
+
+BACKENDS = {"exact": ExactIndex, "quantized": QuantizedIndex, "ivf": IVFIndex, "ivfpq": IVFIndex, "hnsw": HNSWIndex}
+
+
+def build_index(kind: str, vectors: np.ndarray, **params) -> VectorIndex:
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown index kind: {kind} (expected one of {', '.join(BACKENDS)})")
+    if kind == "ivfpq":
+        params.setdefault("pq_m", 48)
+    elif kind == "ivf":
+        params["pq_m"] = 0
+    return BACKENDS[kind].build(vectors, **params)
+
+
+def save_index(index: VectorIndex, out_dir: str, source: str = ""):
+    """Write the index directory next to out_dir and publish it atomically, like build_store"""
+    with build_lock(out_dir):
+        _save_index(index, out_dir, source)
+
+
+def _save_index(index: VectorIndex, out_dir: str, source: str):
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    tmp_dir = tempfile.mkdtemp(prefix=".vector_index_", dir=parent)
+    index.save_arrays(tmp_dir)
+
+    manifest = {
+        "format": INDEX_FORMAT,
+        "version": INDEX_VERSION,
+        "kind": index.kind,
+        "count": len(index),
+        "params": index.params(),
+        "source": source,
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    publish_directory(tmp_dir, out_dir)
+
+
+def read_manifest(path: str) -> Dict:
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != INDEX_FORMAT:
+        raise ValueError(f"{path} is not a vector index")
+    if manifest.get("version") != INDEX_VERSION:
+        raise ValueError(f"Unsupported vector index version {manifest.get('version')} (expected {INDEX_VERSION})")
+    return manifest
+
+
+def load_index(path: str, vectors: Optional[np.ndarray] = None) -> Tuple[VectorIndex, Dict]:
+    # Manifest and arrays from the same version, even if the index is rebuilt meanwhile
+    path = os.path.realpath(path)
+    manifest = read_manifest(path)
+    return BACKENDS[manifest["kind"]].load(path, manifest["params"], vectors), manifest
+
+
+def open_index(kind: str, path: str, vectors: np.ndarray, source: str, precision: str = "float32") -> VectorIndex:
+    """
+    The index for an embedding column: float32 exact search wraps the
+    (memory-mapped) column directly; quantized exact search and the
+    approximate kinds are loaded from path, and built there first if missing,
+    of another kind or precision, or built from other data (source differs)
+    precision only applies to exact search
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision} (expected one of {', '.join(PRECISIONS)})")
+
+    params = {}
+    if kind == "exact":
+        if precision == "float32":
+            return ExactIndex(vectors)
+        kind, params = "quantized", {"precision": precision}
+
+    if os.path.exists(os.path.join(path, "manifest.json")):
+        # Compared before loading, so an index of another kind or precision is never mapped
+        manifest = read_manifest(path)
+        if (
+            manifest["kind"] == kind
+            and manifest["source"] == source
+            and all(manifest["params"].get(name) == value for name, value in params.items())
+        ):
+            return load_index(path, vectors)[0]
+    print(f"Building {kind} index at {path}")
+    save_index(build_index(kind, vectors, **params), path, source)
+    return load_index(path, vectors)[0]
+
+
+def main():
+    from pose_store import PoseStore
+
+    parser = argparse.ArgumentParser(description="Build a vector index for an embedding column of the pose store")
+    parser.add_argument("store_path")
+    parser.add_argument("column", help="embedding column, e.g. Benefits_emb")
+    parser.add_argument("--kind", choices=["quantized"] + [k for k in INDEX_KINDS if k != "exact"], default="ivf")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--nlist", type=int, default=0, help="ivf lists (default 4 * sqrt(n))")
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--pq-m", type=int, default=48, help="ivfpq subspaces")
+    parser.add_argument("--refine", type=int, default=10, help="ivfpq candidates rescored per result")
+    parser.add_argument("--ef", type=int, default=64, help="hnsw search breadth")
+    parser.add_argument("--precision", choices=["int8"], default="int8", help="quantized codes")
+    parser.add_argument("--rescore", type=int, default=4, help="quantized candidates rescored per result")
+    args = parser.parse_args()
+
+    store = PoseStore(args.store_path)
+    params = {
+        "nlist": args.nlist, "nprobe": args.nprobe, "refine": args.refine, "ef": args.ef,
+        "precision": args.precision, "rescore": args.rescore,
+    }
+    if args.kind == "ivfpq":
+        params["pq_m"] = args.pq_m
+    index = build_index(args.kind, store.embeddings(args.column), **params)
+    save_index(index, args.out, source=f"{store.version}:{args.column}")
+    print(f"Wrote {index.kind} index over {len(index)} vectors to {args.out}")
+
+
+if __name__ == "__main__":
+    main()